@@ -26,6 +26,7 @@ if config.config_file_name is not None:
 
 from src.auth import models as models_auth
 from src.board import models as models_board
+from src.jobs import models as models_jobs
 from src.db import Base
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -0,0 +1,52 @@
+"""Ticket status enum
+
+Revision ID: 20ee9b328dfb
+Revises: d4070f6d8c23
+Create Date: 2026-10-19 19:31:08.417262
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '20ee9b328dfb'
+down_revision = 'd4070f6d8c23'
+branch_labels = None
+depends_on = None
+
+ticket_status = postgresql.ENUM('open', 'in_progress', 'review', 'done', name='ticketstatusenum')
+
+# free-form values seen in the wild, anything else (and NULL) becomes open
+NORMALIZE_STATUS = ("CASE regexp_replace(lower(trim(status)), '[\\s-]+', '_', 'g') "
+                    "WHEN 'in_progress' THEN 'in_progress' WHEN 'inprogress' THEN 'in_progress' "
+                    "WHEN 'doing' THEN 'in_progress' WHEN 'wip' THEN 'in_progress' WHEN 'started' THEN 'in_progress' "
+                    "WHEN 'review' THEN 'review' WHEN 'in_review' THEN 'review' WHEN 'code_review' THEN 'review' "
+                    "WHEN 'qa' THEN 'review' WHEN 'testing' THEN 'review' "
+                    "WHEN 'done' THEN 'done' WHEN 'closed' THEN 'done' WHEN 'resolved' THEN 'done' "
+                    "WHEN 'complete' THEN 'done' WHEN 'completed' THEN 'done' WHEN 'finished' THEN 'done' "
+                    "ELSE 'open' END")
+
+
+def upgrade() -> None:
+    op.execute(f"UPDATE tickets SET status = {NORMALIZE_STATUS};")
+    op.execute("UPDATE board_ticket_view SET status = tickets.status FROM tickets "
+               "WHERE tickets.id = board_ticket_view.ticket_id;")
+    ticket_status.create(op.get_bind())
+    op.alter_column('tickets', 'status', type_=ticket_status, postgresql_using='status::ticketstatusenum',
+                    nullable=False, server_default='open')
+    op.alter_column('board_ticket_view', 'status', type_=ticket_status,
+                    postgresql_using='status::ticketstatusenum')
+    # the composite index leads with project_id, so it replaces the single column one
+    op.create_index('ix_tickets_project_status_created', 'tickets', ['project_id', 'status', 'created'], unique=False)
+    op.drop_index('ix_tickets_project_id', table_name='tickets')
+
+
+def downgrade() -> None:
+    op.create_index('ix_tickets_project_id', 'tickets', ['project_id'], unique=False)
+    op.drop_index('ix_tickets_project_status_created', table_name='tickets')
+    op.alter_column('board_ticket_view', 'status', type_=sa.String(), postgresql_using='status::text')
+    op.alter_column('tickets', 'status', type_=sa.String(), postgresql_using='status::text',
+                    nullable=True, server_default=None)
+    ticket_status.drop(op.get_bind())
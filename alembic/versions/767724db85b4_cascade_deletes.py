@@ -0,0 +1,41 @@
+"""Cascade deletes
+
+Revision ID: 767724db85b4
+Revises: 8bdbb5e3e7ea
+Create Date: 2026-10-19 11:40:02.715390
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '767724db85b4'
+down_revision = '8bdbb5e3e7ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_constraint('profiles_user_id_fkey', 'profiles', type_='foreignkey')
+    op.create_foreign_key('profiles_user_id_fkey', 'profiles', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.drop_constraint('projects_user_id_fkey', 'projects', type_='foreignkey')
+    op.create_foreign_key('projects_user_id_fkey', 'projects', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.drop_constraint('tickets_project_id_fkey', 'tickets', type_='foreignkey')
+    op.create_foreign_key('tickets_project_id_fkey', 'tickets', 'projects', ['project_id'], ['id'], ondelete='CASCADE')
+    # the cascades look children up by these columns
+    op.create_index(op.f('ix_profiles_user_id'), 'profiles', ['user_id'], unique=False)
+    op.create_index(op.f('ix_projects_user_id'), 'projects', ['user_id'], unique=False)
+    op.create_index(op.f('ix_tickets_project_id'), 'tickets', ['project_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_tickets_project_id'), table_name='tickets')
+    op.drop_index(op.f('ix_projects_user_id'), table_name='projects')
+    op.drop_index(op.f('ix_profiles_user_id'), table_name='profiles')
+    op.drop_constraint('tickets_project_id_fkey', 'tickets', type_='foreignkey')
+    op.create_foreign_key('tickets_project_id_fkey', 'tickets', 'projects', ['project_id'], ['id'])
+    op.drop_constraint('projects_user_id_fkey', 'projects', type_='foreignkey')
+    op.create_foreign_key('projects_user_id_fkey', 'projects', 'users', ['user_id'], ['id'])
+    op.drop_constraint('profiles_user_id_fkey', 'profiles', type_='foreignkey')
+    op.create_foreign_key('profiles_user_id_fkey', 'profiles', 'users', ['user_id'], ['id'])
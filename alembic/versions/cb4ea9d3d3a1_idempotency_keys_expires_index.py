@@ -0,0 +1,24 @@
+"""Idempotency keys expires index
+
+Revision ID: cb4ea9d3d3a1
+Revises: 20ee9b328dfb
+Create Date: 2026-10-19 20:02:41.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cb4ea9d3d3a1'
+down_revision = '20ee9b328dfb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_idempotency_keys_expires'), 'idempotency_keys', ['expires'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_idempotency_keys_expires'), table_name='idempotency_keys')
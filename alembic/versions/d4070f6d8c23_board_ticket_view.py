@@ -0,0 +1,43 @@
+"""Board ticket view
+
+Revision ID: d4070f6d8c23
+Revises: ee906756dfdc
+Create Date: 2026-10-19 16:48:55.903127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4070f6d8c23'
+down_revision = 'ee906756dfdc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('board_ticket_view',
+    sa.Column('ticket_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=True),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('project_name', sa.String(), nullable=True),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('created', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['ticket_id'], ['tickets.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ticket_id')
+    )
+    op.create_index('ix_board_ticket_view_owner_project_status', 'board_ticket_view',
+                    ['owner_id', 'project_id', 'status', 'ticket_id'], unique=False)
+    op.execute("INSERT INTO board_ticket_view "
+               "(ticket_id, project_id, owner_id, project_name, name, status, created, updated) "
+               "SELECT tickets.id, tickets.project_id, projects.user_id, projects.name, tickets.name, tickets.status, "
+               "tickets.created, tickets.updated "
+               "FROM tickets LEFT OUTER JOIN projects ON tickets.project_id = projects.id;")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_board_ticket_view_owner_project_status', table_name='board_ticket_view')
+    op.drop_table('board_ticket_view')
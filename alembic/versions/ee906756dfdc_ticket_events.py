@@ -0,0 +1,53 @@
+"""Ticket events
+
+Revision ID: ee906756dfdc
+Revises: 3685730a34d7
+Create Date: 2026-10-19 15:31:09.482110
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ee906756dfdc'
+down_revision = '3685730a34d7'
+branch_labels = None
+depends_on = None
+
+# monthly partitions created ahead of time, rows past the last one land in ticket_events_default
+PARTITION_MONTHS = 24
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE ticket_events (
+            id BIGSERIAL NOT NULL,
+            created TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            ticket_id INTEGER NOT NULL,
+            project_id INTEGER,
+            user_id INTEGER,
+            action VARCHAR NOT NULL,
+            changes JSON NOT NULL,
+            PRIMARY KEY (id, created)
+        ) PARTITION BY RANGE (created);
+    """)
+    op.create_index('ix_ticket_events_ticket_id_created_id', 'ticket_events', ['ticket_id', 'created', 'id'], unique=False)
+    first_month = date.today().replace(day=1)
+    for month in range(PARTITION_MONTHS):
+        start, end = add_months(first_month, month), add_months(first_month, month + 1)
+        op.execute(f"CREATE TABLE ticket_events_{start:%Y_%m} PARTITION OF ticket_events "
+                   f"FOR VALUES FROM ('{start}') TO ('{end}');")
+    op.execute("CREATE TABLE ticket_events_default PARTITION OF ticket_events DEFAULT;")
+
+
+def downgrade() -> None:
+    # dropping the parent drops every partition
+    op.drop_table('ticket_events')
@@ -0,0 +1,81 @@
+"""Python CPU per lookup of the hot request queries, ORM Query objects against the cached lambda statements.
+
+Usage: python benchmarks/queries.py [iterations]
+
+Runs against DATABASE_URL (an in-memory sqlite database by default) so the numbers are dominated by
+query construction and compilation rather than by the database.
+
+The gain depends on the SQLAlchemy version: with 1.4 the lambdas took 1.8-2.3x less CPU per lookup, with 2.0 and
+2.1, which already cache the compiled ORM statements, the two are within noise (0.8-1.1x).
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, joinedload
+
+from src.auth.models import Role, RolesEnum, User
+from src.auth.queries import user_by_email
+from src.board import queries
+from src.board.models import Project, Ticket
+from src.db import Base
+
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite://')
+EMAIL = "benchmark@example.com"
+
+
+def orm_user(session):
+    return session.query(User).options(joinedload(User.role)).filter_by(email=EMAIL).first()
+
+
+def orm_project(session):
+    return session.query(Project).filter_by(id=1).filter_by(user_id=1).first()
+
+
+def orm_ticket(session):
+    return session.query(Ticket).filter(Ticket.id == 1).join(Ticket.project).filter_by(user_id=1).first()
+
+
+CASES = [
+    ("user by email", orm_user, lambda session: user_by_email(session, EMAIL)),
+    ("project by id + owner", orm_project, lambda session: queries.project_by_id(session, 1, 1)),
+    ("ticket by id + owner", orm_ticket, lambda session: queries.ticket_by_id(session, 1, 1)),
+]
+
+
+def setup(engine):
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        role = Role(id=1, name=RolesEnum.manager)
+        user = User(id=1, username="benchmark", email=EMAIL, password="", role=role)
+        project = Project(id=1, name="benchmark", description="", user_id=1)
+        session.add_all([role, user, project, Ticket(id=1, name="benchmark", description="", project_id=1)])
+        session.commit()
+
+
+def measure(engine, lookup, iterations):
+    with Session(engine) as session:
+        lookup(session)  # warm up the compiled cache and the connection
+        start = time.process_time()
+        for _ in range(iterations):
+            lookup(session)
+            # a fresh request session has an empty identity map
+            session.expunge_all()
+        return (time.process_time() - start) / iterations * 10 ** 6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    engine = create_engine(DATABASE_URL)
+    setup(engine)
+    print(f"{'query':<24} {'orm':>10} {'lambda':>10}   cpu per lookup")
+    for name, orm, cached in CASES:
+        orm_us, cached_us = measure(engine, orm, iterations), measure(engine, cached, iterations)
+        print(f"{name:<24} {orm_us:8.1f}us {cached_us:8.1f}us   {orm_us / cached_us:4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Cold start benchmark.
+
+Usage: python benchmarks/startup.py [runs] [--imports]
+
+Times fresh interpreters importing the app, --imports also prints the slowest imports from -X importtime.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENV = {
+    **os.environ,
+    "DATABASE_URL": os.environ.get('DATABASE_URL', 'sqlite://'),
+    "JWT_SECRET_KEY": os.environ.get('JWT_SECRET_KEY', 'benchmark'),
+    "JWT_REFRESH_SECRET_KEY": os.environ.get('JWT_REFRESH_SECRET_KEY', 'benchmark'),
+}
+
+CASES = [
+    ("interpreter", "pass"),
+    ("import app", "import src.main"),
+    ("import app + openapi", "import src.main; src.main.app.openapi()"),
+]
+
+
+def measure(code, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=ENV, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def slowest_imports(limit=15):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import src.main"],
+                            cwd=ROOT, env=ENV, check=True, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative_us), name.rstrip()))
+    return sorted(imports, reverse=True)[:limit]
+
+
+def main():
+    runs = int(next((arg for arg in sys.argv[1:] if arg.isdigit()), 10))
+    for name, code in CASES:
+        timings = measure(code, runs)
+        print(f"{name:<24} median {statistics.median(timings):8.1f} ms   min {min(timings):8.1f} ms")
+    if "--imports" in sys.argv:
+        print()
+        for cumulative_us, name in slowest_imports():
+            print(f"{cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os
+
+from src.cache import CACHE_BACKEND
+from src.ratelimit import RATE_LIMIT_BACKEND, RATE_LIMIT_ENABLED
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+
+# requests are mostly CPU work (bcrypt, pydantic, ORM), so one worker per available core
+workers = int(os.environ.get('WEB_CONCURRENCY', len(os.sched_getaffinity(0))))
+worker_class = 'src.server.UvicornWorker'
+
+if CACHE_BACKEND == 'memory' and workers > 1:
+    # every worker would serve its own copy of the cache, stale after writes handled by the others
+    raise RuntimeError("CACHE_BACKEND=memory needs WEB_CONCURRENCY=1, use redis with several workers")
+
+# proxies trusted to set X-Forwarded-For, anonymous requests are rate limited on the client ip it carries
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1,::1')
+
+# import the app once in the master and fork workers with modules already loaded.
+# DBSessionMiddleware creates its engine when a worker builds the middleware stack on lifespan startup,
+# so no pooled connections are shared across the fork
+preload_app = True
+
+timeout = int(os.environ.get('TIMEOUT', 60))
+# time for in-flight requests and the job queue to drain on SIGTERM
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('KEEPALIVE', 5))
+
+max_requests = int(os.environ.get('MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 0))
+
+accesslog = '-'
+
+
+def when_ready(server):
+    if RATE_LIMIT_ENABLED and RATE_LIMIT_BACKEND == 'memory' and workers > 1:
+        # buckets are per worker, a client spread over them gets up to that many times each budget
+        server.log.warning("RATE_LIMIT_BACKEND=memory with %s workers allows up to %s times every budget, "
+                           "use redis with several workers", workers, workers)
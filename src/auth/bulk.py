@@ -0,0 +1,99 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Set
+
+from fastapi_sqlalchemy import db
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
+
+from src.auth.models import Role, User
+from src.auth.schema import User as UserSchema
+from src.utils import get_hashed_password
+
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))  # users per query, hashing round and transaction
+BULK_HASH_WORKERS = int(os.environ.get('BULK_HASH_WORKERS', os.cpu_count() or 1))
+
+
+@lru_cache()
+def get_hash_pool() -> ProcessPoolExecutor:
+    # bcrypt is CPU bound, hashes are spread over processes. spawn, because forking a process
+    # that runs threads can leave locks held in the children
+    return ProcessPoolExecutor(BULK_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shutdown_hash_pool():
+    if get_hash_pool.cache_info().currsize:
+        get_hash_pool().shutdown()
+        get_hash_pool.cache_clear()
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    return [get_hashed_password(password) for password in passwords]
+
+
+async def hash_in_pool(passwords: List[str]) -> List[str]:
+    loop = asyncio.get_event_loop()
+    size = -(-len(passwords) // BULK_HASH_WORKERS)  # one slice per worker
+    slices = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    hashed = await asyncio.gather(*[loop.run_in_executor(get_hash_pool(), hash_passwords, part) for part in slices])
+    return [password for part in hashed for password in part]
+
+
+def get_role_ids() -> Set[int]:
+    with db():
+        return {role_id for role_id, in db.session.query(Role.id)}
+
+
+def find_existing(emails: List[str]) -> Set[str]:
+    with db():
+        return {email for email, in db.session.query(User.email).filter(User.email.in_(emails))}
+
+
+def insert_users(rows: List[dict]) -> Dict[str, int]:
+    """Insert the rows in one statement and transaction, returns the ids by email."""
+    with db():
+        db.session.execute(insert(User), rows)
+        db.session.commit()
+        # executemany returns no primary keys, the emails are unique within the rows
+        return dict(db.session.query(User.email, User.id).filter(User.email.in_([row["email"] for row in rows])))
+
+
+def result_line(row: int, data: UserSchema, **result) -> str:
+    return json.dumps({"row": row, "email": data.email, **result}) + "\n"
+
+
+async def import_users(users: List[UserSchema]) -> AsyncIterator[str]:
+    """Create the users chunk by chunk, yielding one json line per user in request order."""
+    role_ids = await run_in_threadpool(get_role_ids)
+    seen = set()
+    for start in range(0, len(users), BULK_CHUNK_SIZE):
+        chunk = list(enumerate(users[start:start + BULK_CHUNK_SIZE], start))
+        errors = {}
+        for row, data in chunk:
+            if data.email in seen:
+                errors[row] = "Duplicate email in request"
+            elif data.role_id not in role_ids:
+                errors[row] = "Unknown role"
+            seen.add(data.email)
+        existing = await run_in_threadpool(find_existing, [data.email for row, data in chunk if row not in errors])
+        for row, data in chunk:
+            if row not in errors and data.email in existing:
+                errors[row] = "User with this email already exist"
+
+        valid = [(row, data) for row, data in chunk if row not in errors]
+        ids = {}
+        if valid:
+            hashed = await hash_in_pool([data.password for row, data in valid])
+            ids = await run_in_threadpool(insert_users, [
+                dict(username=data.username, email=data.email, password=password, role_id=data.role_id)
+                for (row, data), password in zip(valid, hashed)
+            ])
+        for row, data in chunk:
+            if row in errors:
+                yield result_line(row, data, status="error", detail=errors[row])
+            else:
+                yield result_line(row, data, status="created", id=ids[data.email])
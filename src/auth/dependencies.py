@@ -5,16 +5,17 @@ from fastapi.security import OAuth2PasswordBearer
 from src.utils import (
     ALGORITHM,
     JWT_SECRET_KEY,
-    JWT_REFRESH_SECRET_KEY
+    JWT_REFRESH_SECRET_KEY,
+    get_jwt
 )
 
-from jose import jwt
+from jose.exceptions import JWTError
 from pydantic import ValidationError
 from src.auth.schema import UserResponse
 from src.auth.schema import TokenPayload
 from fastapi_sqlalchemy import db
 
-from src.auth.models import User as ModelUser
+from src.auth.queries import user_by_email
 
 reuseable_oauth = OAuth2PasswordBearer(
     tokenUrl="auth/login",
@@ -24,7 +25,7 @@ reuseable_oauth = OAuth2PasswordBearer(
 
 async def get_current_user(token: str = Depends(reuseable_oauth)) -> UserResponse:
     try:
-        payload = jwt.decode(
+        payload = get_jwt().decode(
             token, JWT_SECRET_KEY, algorithms=[ALGORITHM]
         )
         token_data = TokenPayload(**payload)
@@ -35,14 +36,14 @@ async def get_current_user(token: str = Depends(reuseable_oauth)) -> UserRespons
                 detail="Token expired",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-    except(jwt.JWTError, ValidationError) as e:
+    except(JWTError, ValidationError) as e:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = db.session.query(ModelUser).filter_by(email=token_data.sub).first()
+    user = user_by_email(db.session, token_data.sub)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -53,7 +54,7 @@ async def get_current_user(token: str = Depends(reuseable_oauth)) -> UserRespons
 
 async def get_current_user_refresh(token: str = Depends(reuseable_oauth)) -> UserResponse:
     try:
-        payload = jwt.decode(
+        payload = get_jwt().decode(
             token, JWT_REFRESH_SECRET_KEY, algorithms=[ALGORITHM]
         )
         token_data = TokenPayload(**payload)
@@ -64,14 +65,14 @@ async def get_current_user_refresh(token: str = Depends(reuseable_oauth)) -> Use
                 detail="Token expired",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-    except(jwt.JWTError, ValidationError) as e:
+    except(JWTError, ValidationError) as e:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = db.session.query(ModelUser).filter_by(email=token_data.sub).first()
+    user = user_by_email(db.session, token_data.sub)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
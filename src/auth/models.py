@@ -3,14 +3,11 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy import Enum
-from passlib.context import CryptContext
 
 import enum
 
 from src.db import Base
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 
 class RolesEnum(enum.Enum):
     admin = "admin"
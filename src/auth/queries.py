@@ -0,0 +1,12 @@
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import Session, joinedload
+
+from src.auth.models import User
+
+
+# lambda statements are built and compiled once per lambda, later calls only bind the new parameters
+# (this saves CPU on SQLAlchemy 1.4, 2.x caches the ORM statements as well, see benchmarks/queries.py)
+
+def user_by_email(session: Session, email: str):
+    stmt = lambda_stmt(lambda: select(User).options(joinedload(User.role)).where(User.email == email))
+    return session.execute(stmt).scalars().first()
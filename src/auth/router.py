@@ -1,4 +1,6 @@
 from fastapi import APIRouter, status, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from typing import List
 from starlette.status import HTTP_204_NO_CONTENT
 from fastapi.security import OAuth2PasswordRequestForm
 from src.auth.schema import User as UserSchema
@@ -12,7 +14,13 @@ from src.utils import (
     verify_password
 )
 from src.auth.models import User as ModelUser
+from src.auth.queries import user_by_email
 from src.auth.dependencies import get_current_user, RoleChecker, get_current_user_refresh
+from src.auth.bulk import import_users
+from src.board import history
+from src.board.models import Project as ModelProject
+from src.sharding import ShardSessions, get_shards
+from src.cache import cache, invalidate_profiles
 
 router = APIRouter(prefix="/auth")
 
@@ -36,7 +44,7 @@ async def create_user(data: UserSchema):
 
 @router.post('/login', summary="Create access and refresh tokens for user", response_model=TokenSchema, tags=['auth'])
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = db.session.query(ModelUser).filter_by(email=form_data.username).first()
+    user = user_by_email(db.session, form_data.username)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -51,13 +59,19 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
 
     return {
-        "access_token": create_access_token(user.email),
+        "access_token": create_access_token(user.email, role=user.role.name.value),
         "refresh_token": create_refresh_token(user.email),
     }
 
 allow_read_resource = RoleChecker(["admin"])
 
 
+@router.post('/users/bulk', summary="Create many users, streams one json line of result per user",
+             dependencies=[Depends(allow_read_resource)], tags=['auth'])
+async def create_users_bulk(data: List[UserSchema]):
+    return StreamingResponse(import_users(data), media_type="application/x-ndjson")
+
+
 @router.get('/my_user', summary='Get details of currently logged in user', response_model=UserResponse, tags=['auth'])
 async def get_me(user: ModelUser = Depends(get_current_user)):
     return user
@@ -66,7 +80,7 @@ async def get_me(user: ModelUser = Depends(get_current_user)):
 @router.get('/refresh', summary='Get tokens using refresh token', tags=['auth'])
 async def refresh(user: ModelUser = Depends(get_current_user_refresh)):
     return {
-        "access_token": create_access_token(user.email),
+        "access_token": create_access_token(user.email, role=user.role),
         "refresh_token": create_refresh_token(user.email),
     }
 
@@ -81,7 +95,7 @@ async def patch_user(data: UserUpdate, user: ModelUser = Depends(get_current_use
         to_update["password"] = get_hashed_password(to_update["password"])
     db.session.query(ModelUser).filter_by(id=user.id).update(to_update, synchronize_session=False)
     db.session.commit()
-    access_token = create_access_token(to_update.get('email'))
+    access_token = create_access_token(to_update.get('email'), role=user.role)
     refresh_token = create_refresh_token(to_update.get('email'))
     response = UserResponse(**to_update, role=user.role).dict()
     response['access_token'] = access_token
@@ -90,8 +104,16 @@ async def patch_user(data: UserUpdate, user: ModelUser = Depends(get_current_use
 
 
 @router.delete("/my_user", status_code=HTTP_204_NO_CONTENT, tags=['auth'])
-def delete_user(user: ModelUser = Depends(get_current_user)):
-    db_user = db.session.query(ModelUser).filter_by(id=user.id).first()
-    db.session.delete(db_user)
+async def delete_user(user: ModelUser = Depends(get_current_user), shards: ShardSessions = Depends(get_shards)):
+    # profiles, projects and their tickets are removed by ON DELETE CASCADE foreign keys
+    session = shards.for_owner(user.id)
+    history.record_deleted(session, history.owned_tickets(user.id), user.id)
+    if shards.router.sharded:
+        # projects on a shard have no foreign key to the users table
+        session.query(ModelProject).filter_by(user_id=user.id).delete(synchronize_session=False)
+        session.commit()
+    db.session.query(ModelUser).filter_by(id=user.id).delete(synchronize_session=False)
     db.session.commit()
+    await cache.invalidate("projects:all", "tickets")
+    await invalidate_profiles(user.id)
     return None
@@ -0,0 +1,122 @@
+import os
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import JSON, Integer, event, insert, literal, select, text, tuple_
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import ColumnElement
+
+from src.board.models import Project, Ticket, TicketEvent
+
+SESSION_KEY = "ticket_events"
+PARTITION_MONTHS_AHEAD = int(os.environ.get('PARTITION_MONTHS_AHEAD', 12))  # monthly partitions kept in advance
+PARTITION_CHECK_INTERVAL = int(os.environ.get('PARTITION_CHECK_INTERVAL', 60 * 60 * 24))  # seconds
+
+
+def record(session: Session, ticket_id: int, project_id: int, user_id: int, action: str, changes: dict):
+    """Queue a ticket event, the events of a transaction are written with one INSERT right before it commits."""
+    session.info.setdefault(SESSION_KEY, []).append({
+        "ticket_id": ticket_id,
+        "project_id": project_id,
+        "user_id": user_id,
+        "action": action,
+        "changes": changes,
+    })
+
+
+def record_deleted(session: Session, tickets: ColumnElement, user_id: int):
+    """Write deleted events of the tickets matching the filter, for deletes that cascade from their project.
+
+    One INSERT ... SELECT in the deleting transaction, the tickets never leave the database.
+    """
+    deleted = select(Ticket.id, Ticket.project_id, literal(user_id, Integer), literal("deleted"),
+                     literal({}, JSON)).where(tickets)
+    session.execute(insert(TicketEvent).from_select(["ticket_id", "project_id", "user_id", "action", "changes"],
+                                                    deleted))
+
+
+def owned_tickets(user_id: int) -> ColumnElement:
+    return Ticket.project_id.in_(select(Project.id).where(Project.user_id == user_id))
+
+
+def diff(stored: BaseModel, update_data: dict) -> dict:
+    return {field: [getattr(stored, field), value] for field, value in update_data.items()
+            if getattr(stored, field) != value}
+
+
+@event.listens_for(Session, "before_commit")
+def write_events(session):
+    events = session.info.pop(SESSION_KEY, None)
+    if events:
+        session.execute(insert(TicketEvent), events)
+
+
+@event.listens_for(Session, "after_rollback")
+def discard_events(session):
+    session.info.pop(SESSION_KEY, None)
+
+
+def encode_cursor(ticket_event: TicketEvent) -> str:
+    return f"{ticket_event.created.isoformat()},{ticket_event.id}"
+
+
+def page(events: Query, cursor: Optional[str], limit: int) -> Tuple[List[TicketEvent], Optional[str]]:
+    """Keyset page of the events newest first, with the cursor of the next page (None on the last one)."""
+    if cursor:
+        created, event_id = decode_cursor(cursor)
+        # the bound on created also prunes newer partitions
+        events = events.filter(TicketEvent.created <= created,
+                               tuple_(TicketEvent.created, TicketEvent.id) < (created, event_id))
+    rows = events.order_by(TicketEvent.created.desc(), TicketEvent.id.desc()).limit(limit + 1).all()
+    return rows[:limit], encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created, event_id = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(created), int(event_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def ensure_partitions(session: Session, months: int = PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create the missing monthly ticket_events partitions from this month on, returns their names.
+
+    Only postgres partitions the table. Rows of a month without a partition went to ticket_events_default,
+    they are moved into the new partition since postgres refuses to attach one over them.
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return []
+    # concurrent runs (one per worker process) wait for each other instead of racing on CREATE TABLE
+    session.execute(text("SELECT pg_advisory_xact_lock(hashtext('ticket_events_partitions'))"))
+    # the table on the search path, not every schema's
+    existing = {name for name, in session.execute(text(
+        "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'ticket_events'::regclass"))}
+    first_month = date.today().replace(day=1)
+    created = []
+    for month in range(months):
+        start, end = add_months(first_month, month), add_months(first_month, month + 1)
+        name = f"ticket_events_{start:%Y_%m}"
+        if name in existing:
+            continue
+        session.execute(text(f"CREATE TABLE {name} (LIKE ticket_events INCLUDING DEFAULTS)"))
+        session.execute(text(f"WITH moved AS (DELETE FROM ticket_events_default "
+                             f"WHERE created >= :start AND created < :end RETURNING *) "
+                             f"INSERT INTO {name} SELECT * FROM moved"), {"start": start, "end": end})
+        # the primary key and indexes of the parent are created on the partition as it is attached
+        session.execute(text(f"ALTER TABLE ticket_events ATTACH PARTITION {name} "
+                             f"FOR VALUES FROM ('{start}') TO ('{end}')"))
+        created.append(name)
+    session.commit()
+    return created
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Union
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.board.models import IdempotencyKey
+
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 60 * 60 * 24))  # 24 hours
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000))
+IDEMPOTENCY_PURGE_INTERVAL = int(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL', 60 * 60))  # seconds
+
+# (user_id, endpoint, key) -> (expires, request_hash, response), saves the lookup query for retries hitting the same worker
+_cache = OrderedDict()
+
+
+def fingerprint(data: BaseModel) -> str:
+    return hashlib.sha256(data.json(sort_keys=True).encode()).hexdigest()
+
+
+def _remember(cache_key: tuple, request_hash: str, response: dict, ttl: float):
+    _cache[cache_key] = (time.monotonic() + ttl, request_hash, response)
+    _cache.move_to_end(cache_key)
+    if len(_cache) > IDEMPOTENCY_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def get_stored_response(session: Session, key: Union[str, None], user_id: int, endpoint: str,
+                        request_hash: str) -> Union[dict, None]:
+    """Response of an earlier request with the same key, None if the request has to be executed."""
+    if key is None:
+        return None
+    cache_key = (user_id, endpoint, key)
+    cached = _cache.get(cache_key)
+    if cached is not None and cached[0] > time.monotonic():
+        _, stored_hash, response = cached
+    else:
+        stored = session.query(IdempotencyKey).filter_by(user_id=user_id, endpoint=endpoint, key=key).first()
+        if stored is None:
+            return None
+        expires = stored.expires if stored.expires.tzinfo else stored.expires.replace(tzinfo=timezone.utc)  # sqlite
+        ttl = (expires - datetime.now(timezone.utc)).total_seconds()
+        if ttl <= 0:
+            # expired keys are removed lazily, in the transaction that reuses them
+            session.delete(stored)
+            session.flush()
+            return None
+        stored_hash, response = stored.request_hash, stored.response
+        _remember(cache_key, stored_hash, response, ttl)
+    if stored_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request"
+        )
+    return response
+
+
+def commit(session: Session, key: Union[str, None], user_id: int, endpoint: str, request_hash: str,
+           response: dict) -> dict:
+    """Commit the pending insert together with its key, returns the response to send."""
+    if key is None:
+        session.commit()
+        return response
+    session.add(IdempotencyKey(key=key, user_id=user_id, endpoint=endpoint, request_hash=request_hash,
+                               response=response,
+                               expires=datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL)))
+    try:
+        session.commit()
+    except IntegrityError:
+        # a concurrent retry with the same key committed first, drop our insert and replay its response
+        session.rollback()
+        stored = get_stored_response(session, key, user_id, endpoint, request_hash)
+        if stored is None:
+            raise
+        return stored
+    _remember((user_id, endpoint, key), request_hash, response, IDEMPOTENCY_TTL)
+    return response
+
+
+def purge_expired(session: Session, chunk_size: int) -> int:
+    """Delete the expired keys in short chunked transactions, returns how many were deleted."""
+    now = datetime.now(timezone.utc)
+    purged = 0
+    while True:
+        chunk = select(IdempotencyKey.id).where(IdempotencyKey.expires <= now).limit(chunk_size)
+        deleted = session.query(IdempotencyKey).filter(IdempotencyKey.id.in_(chunk)).delete(synchronize_session=False)
+        session.commit()
+        purged += deleted
+        if deleted < chunk_size:
+            return purged
@@ -1,12 +1,12 @@
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Column, DateTime, Enum, ForeignKey, Index, Integer, String, Float, JSON, UniqueConstraint
+from sqlalchemy.orm import backref, relationship
 from sqlalchemy.sql import func
-from passlib.context import CryptContext
 from src.auth.models import User
 
-from src.db import Base
+import enum
+from datetime import datetime, timezone
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from src.db import Base
 
 
 class Profile(Base):
@@ -16,8 +16,8 @@ class Profile(Base):
     last_name = Column(String, nullable=True)
     phone_number = Column(String, nullable=True)
     avatar_url = Column(String, nullable=True)
-    user_id = Column(Integer, ForeignKey(User.id))
-    user = relationship(User, backref="profiles")
+    user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"), index=True)
+    user = relationship(User, backref=backref("profiles", cascade="all", passive_deletes=True))
     created = Column(DateTime(timezone=True), server_default=func.now())
     updated = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -27,23 +27,94 @@ class Project(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     description = Column(String)
-    user_id = Column(Integer, ForeignKey(User.id))
-    user = relationship("User", backref="projects")
+    user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"), index=True)
+    user = relationship("User", backref=backref("projects", cascade="all", passive_deletes=True))
     created = Column(DateTime(timezone=True), server_default=func.now())
     updated = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # lets src.sharding start the ids of sqlite shards at their range
+    __table_args__ = {'sqlite_autoincrement': True}
+
+
+class TicketStatusEnum(enum.Enum):
+    # declaration order is the workflow order, postgres sorts enum values by it
+    open = "open"
+    in_progress = "in_progress"
+    review = "review"
+    done = "done"
+
 
 class Ticket(Base):
     __tablename__ = 'tickets'
     id = Column(Integer, primary_key=True)
     name = Column(String)
     description = Column(String)
-    status = Column(String)
-    project_id = Column(Integer, ForeignKey(Project.id))
-    project = relationship("Project", backref="tickets")
+    status = Column(Enum(TicketStatusEnum), nullable=False, default=TicketStatusEnum.open, server_default="open")
+    project_id = Column(Integer, ForeignKey(Project.id, ondelete="CASCADE"))
+    project = relationship("Project", backref=backref("tickets", cascade="all", passive_deletes=True))
     created = Column(DateTime(timezone=True), server_default=func.now())
     updated = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # board columns are range scans of one (project, status), the index also serves project_id lookups
+    __table_args__ = (Index('ix_tickets_project_status_created', 'project_id', 'status', 'created'),
+                      {'sqlite_autoincrement': True})
+
+
+class BoardTicketView(Base):
+    """Denormalized read model of tickets with their project, kept in sync by src.board.read_model."""
+    __tablename__ = 'board_ticket_view'
+    ticket_id = Column(Integer, ForeignKey(Ticket.id, ondelete="CASCADE"), primary_key=True)
+    project_id = Column(Integer)
+    owner_id = Column(Integer)
+    project_name = Column(String)
+    name = Column(String)
+    status = Column(Enum(TicketStatusEnum))
+    created = Column(DateTime(timezone=True))
+    updated = Column(DateTime(timezone=True))
+
+    # board reads are a range scan of one owner's (project, status) slice
+    __table_args__ = (Index('ix_board_ticket_view_owner_project_status', 'owner_id', 'project_id', 'status', 'ticket_id'),)
+
+
+class TicketEvent(Base):
+    """Append-only ticket history, range partitioned by month on created (see the migration).
+
+    A periodic job keeps partitions created ahead of time, see src.board.history.ensure_partitions.
+
+    The table's primary key is (id, created) since partitioned tables need the partition key in it,
+    id alone is unique and enough for the ORM.
+    """
+    __tablename__ = 'ticket_events'
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # set by python so every database stores it in the format cursors bind it in (sqlite compares strings)
+    created = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now(),
+                     nullable=False)
+    ticket_id = Column(Integer, nullable=False)
+    project_id = Column(Integer)
+    user_id = Column(Integer)
+    action = Column(String, nullable=False)
+    changes = Column(JSON, nullable=False)
+
+    __table_args__ = (
+        Index('ix_ticket_events_ticket_id_created_id', 'ticket_id', 'created', 'id'),
+        {'postgresql_partition_by': 'RANGE (created)'},
+    )
+
+
+class IdempotencyKey(Base):
+    __tablename__ = 'idempotency_keys'
+    id = Column(Integer, primary_key=True)
+    key = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey(User.id, ondelete="CASCADE"), nullable=False)
+    endpoint = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False)
+    response = Column(JSON, nullable=False)
+    created = Column(DateTime(timezone=True), server_default=func.now())
+    # the periodic purge looks keys up by expiry
+    expires = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    __table_args__ = (UniqueConstraint('user_id', 'endpoint', 'key', name='uq_idempotency_keys_user_endpoint_key'),)
+
 
 class Kek(Base):
     __tablename__ = 'keks'
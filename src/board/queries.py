@@ -0,0 +1,24 @@
+from typing import Union
+
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import Session
+
+from src.board.models import Project, Ticket
+
+
+# lambda statements are built and compiled once per lambda, later calls only bind the new parameters
+# (this saves CPU on SQLAlchemy 1.4, 2.x caches the ORM statements as well, see benchmarks/queries.py),
+# optional criteria are separate lambdas so each combination gets a cache entry of its own
+
+def project_by_id(session: Session, project_id: int, owner_id: Union[int, None] = None):
+    stmt = lambda_stmt(lambda: select(Project).where(Project.id == project_id))
+    if owner_id is not None:
+        stmt += lambda s: s.where(Project.user_id == owner_id)
+    return session.execute(stmt).scalars().first()
+
+
+def ticket_by_id(session: Session, ticket_id: int, owner_id: Union[int, None] = None):
+    stmt = lambda_stmt(lambda: select(Ticket).where(Ticket.id == ticket_id))
+    if owner_id is not None:
+        stmt += lambda s: s.join(Ticket.project).where(Project.user_id == owner_id)
+    return session.execute(stmt).scalars().first()
@@ -0,0 +1,29 @@
+"""Incremental maintenance of board_ticket_view.
+
+Deleted tickets, and the tickets of deleted projects, leave the view through its ON DELETE CASCADE foreign key.
+"""
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from src.board.models import BoardTicketView, Project, Ticket
+
+COLUMNS = ['ticket_id', 'project_id', 'owner_id', 'project_name', 'name', 'status', 'created', 'updated']
+
+
+def ticket_rows():
+    return (select(Ticket.id, Ticket.project_id, Project.user_id, Project.name, Ticket.name, Ticket.status,
+                   Ticket.created, Ticket.updated)
+            .select_from(Ticket)
+            .outerjoin(Project, Ticket.project_id == Project.id))
+
+
+def refresh_ticket(session: Session, ticket_id: int):
+    """Rebuild the view row of a created or changed ticket, in the transaction of the write."""
+    session.execute(delete(BoardTicketView).where(BoardTicketView.ticket_id == ticket_id))
+    session.execute(insert(BoardTicketView).from_select(COLUMNS, ticket_rows().where(Ticket.id == ticket_id)))
+
+
+def refresh_project(session: Session, project_id: int, name: str, owner_id: int):
+    session.execute(update(BoardTicketView)
+                    .where(BoardTicketView.project_id == project_id)
+                    .values(project_name=name, owner_id=owner_id))
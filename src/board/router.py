@@ -1,4 +1,6 @@
-from fastapi import APIRouter, status, HTTPException, Depends, File, UploadFile
+import os
+
+from fastapi import APIRouter, status, HTTPException, Depends, File, UploadFile, Response, Query, Header
 from starlette.status import HTTP_204_NO_CONTENT
 from datetime import datetime
 from src.auth.models import User as ModelUser
@@ -7,59 +9,174 @@ from src.board.models import (
     Profile as ModelProfile,
     Project as ModelProject,
     Ticket as ModelTicket,
+    TicketEvent as ModelTicketEvent,
+    TicketStatusEnum,
+    BoardTicketView as ModelBoardTicketView,
 )
 from typing import List, Union
 from src.board.schema import Profile as SchemaProfile
+from src.board.tasks import purge_project
+from src.board import history, idempotency, queries, read_model
 from src.auth.schema import UserUpdate as SchemaUser
+from src.utils import to_columns
+from src.cache import cache, card_cache, invalidate_profiles
+from src.sharding import ShardSessions, get_shards, merge_pages
 
 from fastapi_sqlalchemy import db
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from operator import attrgetter
 
 from src.board.schema import (
     ProfileWithId as SchemaProfileWithId,
+    ProfileCard as SchemaProfileCard,
     Project as ProjectSchema,
     ProjectChange as ProjectChangeSchema,
     Ticket as TicketSchema,
     TicketChange as TicketChangeSchema,
-
+    TicketHistory as TicketHistorySchema,
+    BoardTicket as BoardTicketSchema,
+    BoardSummary as BoardSummarySchema,
+    BoardColumn as BoardColumnSchema,
 )
 
+PROFILE_BATCH_SIZE = int(os.environ.get('PROFILE_BATCH_SIZE', 500))  # user ids per profile card lookup
+
 router = APIRouter(prefix="/board")
 
+
+def cache_scope(user: ModelUser):
+    # admins see every row, so they share one cache scope
+    return "admin" if user.role == "admin" else user.id
+
+
+def owner_scope(user: ModelUser) -> Union[int, None]:
+    # owner to restrict lookups to, None for admins
+    return None if user.role == "admin" else user.id
+
+
+list_format = Query("rows", alias="format", regex="^(rows|columns)$",
+                    description="`columns` returns an object of field name -> list of values")
+offset_param = Query(0, ge=0)
+limit_param = Query(None, ge=1)
+status_param = Query(None, alias="status")
+
+# workflow order, which is how postgres sorts the enum, NULL sorts last
+STATUS_ORDER = {ticket_status: i for i, ticket_status in enumerate(TicketStatusEnum)}
+
+
+def status_order(ticket_status: Union[TicketStatusEnum, None]) -> int:
+    return STATUS_ORDER.get(ticket_status, len(STATUS_ORDER))
+
+
+def board_order(session: Session) -> list:
+    """ORDER BY of board rows that matches board_key, shards are merged by it."""
+    status_column = ModelBoardTicketView.status
+    if session.get_bind().dialect.name != "postgresql":
+        # without a native enum the names are stored, which sort alphabetically
+        status_column = case(*[(ModelBoardTicketView.status == ticket_status, i)
+                               for ticket_status, i in STATUS_ORDER.items()], else_=len(STATUS_ORDER))
+    # on postgres this is index order (ASC sorts NULL last), so the scan needs no sort
+    return [ModelBoardTicketView.project_id.asc().nulls_last(), status_column, ModelBoardTicketView.ticket_id]
+
+
+def board_key(row: ModelBoardTicketView) -> tuple:
+    return row.project_id is None, row.project_id or 0, status_order(row.status), row.ticket_id
+
 admin_permission = RoleChecker(["admin"])
 
 
-@router.get('/profiles', summary='Get list of profiles', dependencies=[Depends(admin_permission)], tags=['profiles'])
-async def get_profiles(user: ModelUser = Depends(get_current_user)):
+@router.get('/profiles', summary='Get list of profiles, or the profile cards of the given users', tags=['profiles'])
+async def get_profiles(user_ids: Union[str, None] = Query(None, regex=r"^\d+(,\d+)*$",
+                                                          description="comma separated user ids"),
+                       fields: Union[str, None] = Query(None, regex=r"^\w+(,\w+)*$",
+                                                        description="comma separated profile card fields"),
+                       response_format: str = list_format, user: ModelUser = Depends(get_current_user)):
+    if user_ids is not None:
+        return await get_profile_cards(user_ids, fields, response_format)
+    # the full list stays admin only
+    admin_permission(user)
     profiles_request = db.session.query(ModelProfile).all()
     response = [SchemaProfileWithId(id=profile.id, user_id=profile.user_id, first_name=profile.first_name,
                                     last_name=profile.last_name,
                                     phone_number=profile.phone_number, avatar_url=profile.avatar_url)
                 for profile in profiles_request]
 
+    if response_format == "columns":
+        return to_columns(response, SchemaProfileWithId)
     return response
 
 
+async def get_profile_cards(user_ids: str, fields: Union[str, None], response_format: str):
+    # dict.fromkeys drops duplicates and keeps the requested order
+    ids = list(dict.fromkeys(int(user_id) for user_id in user_ids.split(',')))
+    if len(ids) > PROFILE_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {PROFILE_BATCH_SIZE} user ids per request"
+        )
+    selected = list(dict.fromkeys(fields.split(','))) if fields else list(SchemaProfileCard.__fields__)
+    unknown = set(selected) - set(SchemaProfileCard.__fields__)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+
+    def load(missing):
+        profiles_request = (db.session.query(ModelProfile.user_id, ModelProfile.first_name, ModelProfile.last_name,
+                                             ModelProfile.avatar_url)
+                            .filter(ModelProfile.user_id.in_(missing)))
+        found = {profile.user_id: SchemaProfileCard(user_id=profile.user_id, first_name=profile.first_name,
+                                                    last_name=profile.last_name, avatar_url=profile.avatar_url).dict()
+                 for profile in profiles_request}
+        # users without a profile are cached as well, boards ask for them on every render
+        return {user_id: found.get(user_id) for user_id in missing}
+
+    # cards are public to every user, they share one scope
+    cards = await card_cache.get_many_or_load({user_id: f"profile:{user_id}" for user_id in ids}, "all", "card", load)
+    response = [SchemaProfileCard(**cards[user_id]) for user_id in ids if cards[user_id] is not None]
+
+    if response_format == "columns":
+        return to_columns(response, SchemaProfileCard, selected)
+    return [card.dict(include=set(selected)) for card in response]
+
+
 @router.get('/my_profile', summary='Get current user profile', response_model=SchemaProfileWithId, tags=['profiles'])
 async def get_profile(user: ModelUser = Depends(get_current_user)):
-    profile = db.session.query(ModelProfile).filter_by(user_id=user.id).first()
-    response = SchemaProfileWithId(id=profile.id, user_id=profile.user_id, first_name=profile.first_name,
-                                   last_name=profile.last_name, phone_number=profile.phone_number,
-                                   avatar_url=profile.avatar_url)
+    def load():
+        profile = db.session.query(ModelProfile).filter_by(user_id=user.id).first()
+        if not profile:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Not Found"
+            )
+        response = SchemaProfileWithId(id=profile.id, user_id=profile.user_id, first_name=profile.first_name,
+                                       last_name=profile.last_name, phone_number=profile.phone_number,
+                                       avatar_url=profile.avatar_url)
+        return response.dict()
 
-    return response
+    return await cache.get_or_load([f"profile:{user.id}"], user.id, "profile", load)
 
 
 @router.post('/my_profile', summary='Create profile', response_model=SchemaProfileWithId, tags=['profiles'])
-async def create_profile(data: SchemaProfile, user: ModelUser = Depends(get_current_user)):
+async def create_profile(data: SchemaProfile, user: ModelUser = Depends(get_current_user),
+                         idempotency_key: Union[str, None] = Header(None)):
+    request_hash = idempotency.fingerprint(data)
+    stored = idempotency.get_stored_response(db.session, idempotency_key, user.id, "create_profile", request_hash)
+    if stored is not None:
+        return stored
     user_id = data.user_id if user.role == "admin" else user.id
     db_profile = ModelProfile(user_id=user_id, first_name=data.first_name, last_name=data.last_name, phone_number=data.phone_number,
                               avatar_url=data.avatar_url)
 
     db.session.add(db_profile)
-    db.session.commit()
+    db.session.flush()
     response = SchemaProfileWithId(id=db_profile.id, user_id=db_profile.user_id, first_name=db_profile.first_name,
                                    last_name=db_profile.last_name, phone_number=db_profile.phone_number,
                                    avatar_url=db_profile.avatar_url)
+    response = idempotency.commit(db.session, idempotency_key, user.id, "create_profile", request_hash, response.dict())
+    await invalidate_profiles(user_id)
     return response
 
 
@@ -73,60 +190,76 @@ async def update_profile(data: SchemaProfile, user: ModelUser = Depends(get_curr
     updated_item = stored_item_model.copy(update=update_data)
     db.session.query(ModelProfile).filter_by(id=profile.id).update(updated_item.dict(), synchronize_session=False)
     db.session.commit()
+    await invalidate_profiles(profile.user_id, updated_item.user_id)
     return updated_item
 
 
 @router.get('/projects', summary='Get list of projects', tags=['projects'])
-async def get_projects(user: ModelUser = Depends(get_current_user)):
-    if user.role == "admin":
-        projects_request = db.session.query(ModelProject).all()
-    else:
-        projects_request = db.session.query(ModelProject).filter_by(user_id=user.id)
+async def get_projects(response_format: str = list_format, offset: int = offset_param, limit: Union[int, None] = limit_param,
+                       user: ModelUser = Depends(get_current_user), shards: ShardSessions = Depends(get_shards)):
+    def load():
+        if user.role == "admin":
+            queries = [session.query(ModelProject) for session in shards.all()]
+        else:
+            queries = [shards.for_owner(user.id).query(ModelProject).filter_by(user_id=user.id)]
+        projects_request = merge_pages([query.order_by(ModelProject.id) for query in queries], key=attrgetter('id'),
+                                       offset=offset, limit=limit)
 
-    response = [ProjectSchema(id=project.id, user_id=project.user_id, name=project.name,
-                              description=project.description, created=project.created, updated=project.updated)
-                for project in projects_request]
+        response = [ProjectSchema(id=project.id, user_id=project.user_id, name=project.name,
+                                  description=project.description, created=project.created, updated=project.updated)
+                    for project in projects_request]
 
-    return response
+        if response_format == "columns":
+            return to_columns(response, ProjectSchema)
+        return [project.dict() for project in response]
+
+    namespace = "projects:all" if user.role == "admin" else f"projects:{user.id}"
+    return await cache.get_or_load([namespace], cache_scope(user), f"projects:{response_format}:{offset}:{limit}", load)
 
 
 @router.get('/projects/{project_id}', summary='Get list of projects', tags=['projects'])
-async def retrieve_project(project_id: int, user: ModelUser = Depends(get_current_user)):
-    if user.role == "admin":
-        projects_request = db.session.query(ModelProject).all()
-    else:
-        projects_request = db.session.query(ModelProject).filter_by(user_id=user.id)
-    projects_request = projects_request.filter_by(id=project_id).first()
-    if not projects_request:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Not Found"
-        )
-    response = ProjectSchema(id=projects_request.id, user_id=projects_request.user_id, name=projects_request.name,
-                              description=projects_request.description, created=projects_request.created, updated=projects_request.updated)
-    return response
+async def retrieve_project(project_id: int, user: ModelUser = Depends(get_current_user),
+                           shards: ShardSessions = Depends(get_shards)):
+    def load():
+        projects_request = queries.project_by_id(shards.for_id(project_id), project_id, owner_scope(user))
+        if not projects_request:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Not Found"
+            )
+        response = ProjectSchema(id=projects_request.id, user_id=projects_request.user_id, name=projects_request.name,
+                                  description=projects_request.description, created=projects_request.created, updated=projects_request.updated)
+        return response.dict()
+
+    return await cache.get_or_load([f"project:{project_id}"], cache_scope(user), "project", load)
 
 
 @router.post('/projects', summary="Create new project", response_model=ProjectSchema, tags=['projects'])
-async def create_project(data: ProjectChangeSchema, user: ModelUser = Depends(get_current_user)):
+async def create_project(data: ProjectChangeSchema, user: ModelUser = Depends(get_current_user),
+                         shards: ShardSessions = Depends(get_shards), idempotency_key: Union[str, None] = Header(None)):
     user_id = data.user_id if user.role == "admin" else user.id # only admins are allowed to assign projects not to themself
+    session = shards.for_owner(user_id)
+    request_hash = idempotency.fingerprint(data)
+    stored = idempotency.get_stored_response(session, idempotency_key, user.id, "create_project", request_hash)
+    if stored is not None:
+        return stored
     db_project = ModelProject(name=data.name, description=data.description, user_id=user_id)
-    db.session.add(db_project)
-    db.session.commit()    # saving user to database
+    session.add(db_project)
+    session.flush()
     response = ProjectSchema(id=db_project.id, name=db_project.name, description=db_project.description,
                              user_id=db_project.user_id,
                              created=db_project.created,
                              updated=db_project.updated)
+    response = idempotency.commit(session, idempotency_key, user.id, "create_project", request_hash, response.dict())
+    await cache.invalidate(f"projects:{user_id}", "projects:all")
     return response
 
 
 @router.patch('/projects/{project_id}', summary="Update project", response_model=ProjectSchema, tags=['projects'])
-async def update_project(project_id: int, data: ProjectChangeSchema, user: ModelUser = Depends(get_current_user)):
-    if user.role != "admin":
-        db_project = db.session.query(ModelProject).filter_by(user_id=user.id)
-    else:
-        db_project = db.session.query(ModelProject).all()
-    db_project = db_project.filter_by(id=project_id).first()
+async def update_project(project_id: int, data: ProjectChangeSchema, user: ModelUser = Depends(get_current_user),
+                         shards: ShardSessions = Depends(get_shards)):
+    session = shards.for_id(project_id)
+    db_project = queries.project_by_id(session, project_id, owner_scope(user))
     if not db_project:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -137,40 +270,65 @@ async def update_project(project_id: int, data: ProjectChangeSchema, user: Model
                                    created=db_project.created
                                    )
     update_data = data.dict(exclude_unset=True)
+    if "user_id" in update_data:
+        shards.check_same_shard(session, shards.for_owner(update_data["user_id"]))
     updated_item = project_stored.copy(update=update_data)
     updated_item.updated = datetime.utcnow()
-    db.session.query(ModelProject).filter_by(id=project_id).update(updated_item.dict(), synchronize_session=False)
-    db.session.commit()
+    session.query(ModelProject).filter_by(id=project_id).update(updated_item.dict(), synchronize_session=False)
+    if "name" in update_data or "user_id" in update_data:
+        read_model.refresh_project(session, project_id, updated_item.name, updated_item.user_id)
+    session.commit()
+    await cache.invalidate(f"project:{project_id}", f"projects:{project_stored.user_id}",
+                           f"projects:{updated_item.user_id}", "projects:all")
+    if updated_item.user_id != project_stored.user_id:
+        # ticket visibility of the old and new owner changed
+        await cache.invalidate("tickets")
     return updated_item
 
 
 @router.delete("/projects/{project_id}", status_code=HTTP_204_NO_CONTENT, tags=['projects'])
-async def delete_project(project_id: int, user: ModelUser = Depends(get_current_user)):
+async def delete_project(project_id: int, background: bool = False, user: ModelUser = Depends(get_current_user),
+                         shards: ShardSessions = Depends(get_shards)):
+    session = shards.for_id(project_id)
+    db_project = session.query(ModelProject).filter_by(id=project_id)
     if user.role != "admin":
-        db_project = db.session.query(ModelProject).filter_by(user_id=user.id)
-    else:
-        db_project = db.session.query(ModelProject).all()
-    db_project = db_project.filter_by(id=project_id).first()
-    if not db_project:
+        db_project = db_project.filter_by(user_id=user.id)
+    owner = db_project.with_entities(ModelProject.user_id).first()
+    if owner is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Not Found"
         )
-    db.session.delete(db_project)
-    db.session.commit()
+    if background:
+        # huge projects are purged in chunks by a background job, which invalidates the cache when it is done
+        purge_project.delay(project_id=project_id, user_id=user.id)
+        db.session.commit()
+        return Response(status_code=status.HTTP_202_ACCEPTED)
+    # tickets are removed by the ON DELETE CASCADE foreign key, nothing is loaded into the session
+    history.record_deleted(session, ModelTicket.project_id == project_id, user.id)
+    db_project.delete(synchronize_session=False)
+    session.commit()
+    await cache.invalidate(f"project:{project_id}", f"projects:{owner.user_id}", "projects:all", "tickets")
     return None
 
 ###############
 
 
 @router.get('/tickets', summary='Get list of tickets', tags=['tickets'])
-async def get_tickets(project_id: Union[int, None] = None, user: ModelUser = Depends(get_current_user)):
+async def get_tickets(project_id: Union[int, None] = None, ticket_status: Union[TicketStatusEnum, None] = status_param,
+                      response_format: str = list_format, offset: int = offset_param, limit: Union[int, None] = limit_param,
+                      user: ModelUser = Depends(get_current_user), shards: ShardSessions = Depends(get_shards)):
     if user.role == "admin":
-        tickets_request = db.session.query(ModelTicket).all()
+        sessions = [shards.for_id(project_id)] if project_id else shards.all()
+        queries = [session.query(ModelTicket) for session in sessions]
     else:
-        tickets_request = db.session.query(ModelTicket).join(ModelTicket.project).filter_by(user_id=user.id)
+        queries = [shards.for_owner(user.id).query(ModelTicket).join(ModelTicket.project).filter_by(user_id=user.id)]
     if project_id:
-        tickets_request = tickets_request.filter(ModelTicket.project_id == project_id)
+        queries = [query.filter(ModelTicket.project_id == project_id) for query in queries]
+    if ticket_status:
+        queries = [query.filter(ModelTicket.status == ticket_status) for query in queries]
+    tickets_request = merge_pages([query.order_by(ModelTicket.id) for query in queries], key=attrgetter('id'),
+                                  offset=offset, limit=limit)
 
     response = [TicketSchema(id=ticket.id,
                              project_id=ticket.project_id,
@@ -182,82 +340,195 @@ async def get_tickets(project_id: Union[int, None] = None, user: ModelUser = Dep
                              )
                 for ticket in tickets_request]
 
+    if response_format == "columns":
+        return to_columns(response, TicketSchema)
     return response
 
 
-@router.get('/tickets/{ticket_id}', summary='Get ticket by id', tags=['tickets'])
-async def retrieve_tickets(ticket_id: int, user: ModelUser = Depends(get_current_user)):
-    if user.role == "admin":
-        tickets_request = db.session.query(ModelTicket).all()
-    else:
-        tickets_request = db.session.query(ModelTicket).join(ModelTicket.project).filter_by(user_id=user.id)
-    tickets_request = tickets_request.filter(ModelTicket.id == ticket_id).first()
-    if not tickets_request:
+def query_ticket(session: Session, ticket_id: int, user: ModelUser):
+    db_ticket = queries.ticket_by_id(session, ticket_id, owner_scope(user))
+    if not db_ticket:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Not Found"
         )
-    response = TicketSchema(id=tickets_request.id, project_id=tickets_request.project_id, name=tickets_request.name,
-                            description=tickets_request.description, status=tickets_request.status,
-                            created=tickets_request.created, updated=tickets_request.updated)
-    return response
+    return db_ticket
+
+
+@router.get('/tickets/{ticket_id}', summary='Get ticket by id', tags=['tickets'])
+async def retrieve_tickets(ticket_id: int, user: ModelUser = Depends(get_current_user),
+                           shards: ShardSessions = Depends(get_shards)):
+    def load():
+        tickets_request = query_ticket(shards.for_id(ticket_id), ticket_id, user)
+        response = TicketSchema(id=tickets_request.id, project_id=tickets_request.project_id, name=tickets_request.name,
+                                description=tickets_request.description, status=tickets_request.status,
+                                created=tickets_request.created, updated=tickets_request.updated)
+        return response.dict()
+
+    # "tickets" is invalidated when a project goes away together with its tickets or changes owner
+    return await cache.get_or_load(["tickets", f"ticket:{ticket_id}"], cache_scope(user), "ticket", load)
 
 
 @router.post('/tickets', summary="Create new ticket", response_model=TicketSchema, tags=['tickets'])
-async def create_tickets(data: TicketChangeSchema, user: ModelUser = Depends(get_current_user)):
-    db_ticket = ModelTicket(name=data.name, description=data.description, project_id=data.project_id, status=data.status)
-    db.session.add(db_ticket)
-    db.session.commit()    # saving user to database
+async def create_tickets(data: TicketChangeSchema, user: ModelUser = Depends(get_current_user),
+                         shards: ShardSessions = Depends(get_shards), idempotency_key: Union[str, None] = Header(None)):
+    # tickets live on the shard of their project
+    session = shards.for_id(data.project_id) if data.project_id else shards.for_owner(user.id)
+    request_hash = idempotency.fingerprint(data)
+    stored = idempotency.get_stored_response(session, idempotency_key, user.id, "create_tickets", request_hash)
+    if stored is not None:
+        return stored
+    db_ticket = ModelTicket(name=data.name, description=data.description, project_id=data.project_id,
+                            status=data.status or TicketStatusEnum.open)
+    session.add(db_ticket)
+    session.flush()
     response = TicketSchema(id=db_ticket.id, name=db_ticket.name, description=db_ticket.description,
                             project_id=db_ticket.project_id,
                             status=db_ticket.status,
                             created=db_ticket.created,
                             updated=db_ticket.updated)
+    history.record(session, db_ticket.id, db_ticket.project_id, user.id, "created", data.dict(exclude_unset=True))
+    read_model.refresh_ticket(session, db_ticket.id)
+    response = idempotency.commit(session, idempotency_key, user.id, "create_tickets", request_hash, response.dict())
     return response
 
 
 @router.patch('/tickets/{ticket_id}', summary="Update ticket", response_model=TicketSchema, tags=['tickets'])
-async def update_tickets(ticket_id: int, data: TicketChangeSchema, user: ModelUser = Depends(get_current_user)):
-    if user.role == "admin":
-        db_ticket = db.session.query(ModelTicket).all()
-    else:
-        db_ticket = db.session.query(ModelTicket).join(ModelTicket.project).filter_by(user_id=user.id)
-
-    db_ticket = db_ticket.filter(ModelTicket.id == ticket_id).first()
-    if not db_ticket:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Not Found"
-        )
+async def update_tickets(ticket_id: int, data: TicketChangeSchema, user: ModelUser = Depends(get_current_user),
+                         shards: ShardSessions = Depends(get_shards)):
+    session = shards.for_id(ticket_id)
+    db_ticket = query_ticket(session, ticket_id, user)
     ticket_stored = TicketSchema(id=db_ticket.id, name=db_ticket.name, description=db_ticket.description,
                                  project_id=db_ticket.project_id,
                                  status=db_ticket.status,
                                  created=db_ticket.created
                                  )
     update_data = data.dict(exclude_unset=True)
+    if update_data.get("project_id"):
+        shards.check_same_shard(session, shards.for_id(update_data["project_id"]))
     updated_item = ticket_stored.copy(update=update_data)
     updated_item.updated = datetime.utcnow()
-    db.session.query(ModelTicket).filter_by(id=ticket_id).update(updated_item.dict(), synchronize_session=False)
-    db.session.commit()
+    session.query(ModelTicket).filter_by(id=ticket_id).update(updated_item.dict(), synchronize_session=False)
+    history.record(session, ticket_id, updated_item.project_id, user.id, "updated", history.diff(ticket_stored, update_data))
+    read_model.refresh_ticket(session, ticket_id)
+    session.commit()
+    await cache.invalidate(f"ticket:{ticket_id}")
     return updated_item
 
 
 @router.delete("/tickets/{ticket_id}", status_code=HTTP_204_NO_CONTENT, tags=['tickets'])
-async def delete_ticket(ticket_id: int, user: ModelUser = Depends(get_current_user)):
+async def delete_ticket(ticket_id: int, user: ModelUser = Depends(get_current_user),
+                        shards: ShardSessions = Depends(get_shards)):
+    session = shards.for_id(ticket_id)
+    db_ticket = query_ticket(session, ticket_id, user)
+    history.record(session, ticket_id, db_ticket.project_id, user.id, "deleted", {})
+    session.delete(db_ticket)
+    session.commit()
+    await cache.invalidate(f"ticket:{ticket_id}")
+    return None
+
+
+@router.get('/tickets/{ticket_id}/history', summary='Get ticket history, newest first', response_model=TicketHistorySchema,
+            tags=['tickets'])
+async def get_ticket_history(ticket_id: int, cursor: Union[str, None] = None, limit: int = Query(50, ge=1, le=500),
+                             user: ModelUser = Depends(get_current_user), shards: ShardSessions = Depends(get_shards)):
+    events_request = shards.for_id(ticket_id).query(ModelTicketEvent).filter(ModelTicketEvent.ticket_id == ticket_id)
+    if user.role != "admin":
+        owned_projects = select(ModelProject.id).where(ModelProject.user_id == user.id)
+        events_request = events_request.filter(ModelTicketEvent.project_id.in_(owned_projects))
+    events, next_cursor = history.page(events_request, cursor, limit)
+    items = [dict(id=ticket_event.id, ticket_id=ticket_event.ticket_id, project_id=ticket_event.project_id,
+                  user_id=ticket_event.user_id, action=ticket_event.action, changes=ticket_event.changes,
+                  created=ticket_event.created)
+             for ticket_event in events]
+    return TicketHistorySchema(items=items, next_cursor=next_cursor)
+
+
+@router.get('/view', summary='Get board tickets with their project from the denormalized view', tags=['tickets'])
+async def get_board(project_id: Union[int, None] = None, ticket_status: Union[TicketStatusEnum, None] = status_param,
+                    response_format: str = list_format, offset: int = offset_param,
+                    limit: int = Query(500, ge=1, le=1000), user: ModelUser = Depends(get_current_user),
+                    shards: ShardSessions = Depends(get_shards)):
     if user.role == "admin":
-        db_ticket = db.session.query(ModelTicket).all()
+        sessions = [shards.for_id(project_id)] if project_id else shards.all()
+        queries = [session.query(ModelBoardTicketView) for session in sessions]
     else:
-        db_ticket = db.session.query(ModelTicket).join(ModelTicket.project).filter_by(user_id=user.id)
+        queries = [shards.for_owner(user.id).query(ModelBoardTicketView).filter(ModelBoardTicketView.owner_id == user.id)]
+    if project_id:
+        queries = [query.filter(ModelBoardTicketView.project_id == project_id) for query in queries]
+    if ticket_status:
+        queries = [query.filter(ModelBoardTicketView.status == ticket_status) for query in queries]
+    board_request = merge_pages([query.order_by(*board_order(query.session)) for query in queries], key=board_key,
+                                offset=offset, limit=limit)
+
+    response = [BoardTicketSchema(ticket_id=row.ticket_id, project_id=row.project_id, owner_id=row.owner_id,
+                                  project_name=row.project_name, name=row.name, status=row.status,
+                                  created=row.created, updated=row.updated)
+                for row in board_request]
+
+    if response_format == "columns":
+        return to_columns(response, BoardTicketSchema)
+    return response
 
-    db_ticket = db_ticket.filter(ModelTicket.id == ticket_id).first()
-    if not db_ticket:
+
+@router.get('/view/summary', summary='Get ticket counts per project and status', tags=['tickets'])
+async def get_board_summary(user: ModelUser = Depends(get_current_user), shards: ShardSessions = Depends(get_shards)):
+    summary = {}
+    for session in (shards.all() if user.role == "admin" else [shards.for_owner(user.id)]):
+        summary_request = session.query(ModelBoardTicketView.project_id, func.max(ModelBoardTicketView.project_name),
+                                        ModelBoardTicketView.status, func.count())
+        if user.role != "admin":
+            summary_request = summary_request.filter(ModelBoardTicketView.owner_id == user.id)
+        summary_request = summary_request.group_by(ModelBoardTicketView.project_id, ModelBoardTicketView.status)
+        for project_id, project_name, ticket_status, count in summary_request:
+            _, total = summary.get((project_id, ticket_status), (None, 0))
+            summary[(project_id, ticket_status)] = (project_name, total + count)
+
+    return [BoardSummarySchema(project_id=project_id, project_name=project_name, status=ticket_status, count=count)
+            for (project_id, ticket_status), (project_name, count)
+            in sorted(summary.items(), key=lambda item: (item[0][0] or 0, status_order(item[0][1])))]
+
+
+def ticket_schema(ticket: ModelTicket) -> TicketSchema:
+    return TicketSchema(id=ticket.id, project_id=ticket.project_id, name=ticket.name, description=ticket.description,
+                        status=ticket.status, created=ticket.created, updated=ticket.updated)
+
+
+def query_column(session: Session, project_id: int, ticket_status: TicketStatusEnum):
+    # equality on (project_id, status) ordered by created, a range scan of ix_tickets_project_status_created
+    return (session.query(ModelTicket)
+            .filter(ModelTicket.project_id == project_id, ModelTicket.status == ticket_status)
+            .order_by(ModelTicket.created, ModelTicket.id))
+
+
+def check_project(session: Session, project_id: int, user: ModelUser):
+    if not queries.project_by_id(session, project_id, owner_scope(user)):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Not Found"
         )
-    db.session.delete(db_ticket)
-    db.session.commit()
-    return None
+
+
+@router.get('/projects/{project_id}/columns', summary='Get board columns of a project, first tickets of every status',
+            response_model=List[BoardColumnSchema], tags=['tickets'])
+async def get_board_columns(project_id: int, limit: int = Query(50, ge=1, le=500),
+                            user: ModelUser = Depends(get_current_user), shards: ShardSessions = Depends(get_shards)):
+    session = shards.for_id(project_id)
+    check_project(session, project_id, user)
+    return [BoardColumnSchema(status=ticket_status,
+                              tickets=[ticket_schema(ticket)
+                                       for ticket in query_column(session, project_id, ticket_status).limit(limit)])
+            for ticket_status in TicketStatusEnum]
+
+
+@router.get('/projects/{project_id}/columns/{ticket_status}', summary='Get a page of one board column',
+            response_model=List[TicketSchema], tags=['tickets'])
+async def get_board_column(project_id: int, ticket_status: TicketStatusEnum, offset: int = offset_param,
+                           limit: int = Query(50, ge=1, le=500), user: ModelUser = Depends(get_current_user),
+                           shards: ShardSessions = Depends(get_shards)):
+    session = shards.for_id(project_id)
+    check_project(session, project_id, user)
+    return [ticket_schema(ticket) for ticket in query_column(session, project_id, ticket_status).offset(offset).limit(limit)]
 
 
 @router.post("/upload-file")
@@ -2,6 +2,8 @@ from pydantic import BaseModel, validator
 from typing import List, Union
 from datetime import date, datetime, time, timedelta
 
+from src.board.models import TicketStatusEnum
+
 
 class Profile(BaseModel):
     user_id: Union[int, None] = None
@@ -23,6 +25,13 @@ class ProfileWithId(BaseModel):
     avatar_url: Union[str, None] = None
 
 
+class ProfileCard(BaseModel):
+    user_id: int
+    first_name: Union[str, None] = None
+    last_name: Union[str, None] = None
+    avatar_url: Union[str, None] = None
+
+
 class Project(BaseModel):
     id: int
     name: str
@@ -61,11 +70,14 @@ class Ticket(BaseModel):
     id: int
     name: str
     description: str
-    status: str
+    status: TicketStatusEnum
     project_id: int
     created: datetime
     updated: Union[datetime, None] = None
 
+    class Config:
+        use_enum_values = True
+
     @validator('created', 'updated', pre=True)
     def parse_datetime(cls, value):
         if isinstance(value, str):
@@ -86,5 +98,74 @@ class Ticket(BaseModel):
 class TicketChange(BaseModel):
     name: Union[str, None] = None
     description: Union[str, None] = None
-    status: Union[str, None] = None
+    status: Union[TicketStatusEnum, None] = None
+    project_id: Union[int, None] = None
+
+    class Config:
+        use_enum_values = True
+
+    @validator('status', pre=True)
+    def status_not_null(cls, value):
+        # left out means unchanged, the column itself is NOT NULL
+        if value is None:
+            raise ValueError("status may not be null")
+        return value
+
+
+class TicketEvent(BaseModel):
+    id: int
+    ticket_id: int
+    project_id: Union[int, None] = None
+    user_id: Union[int, None] = None
+    action: str
+    changes: dict
+    created: datetime
+
+    @validator('created', whole=True)
+    def format_datetime(cls, value):
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return value
+
+
+class TicketHistory(BaseModel):
+    items: List[TicketEvent]
+    next_cursor: Union[str, None] = None
+
+
+class BoardTicket(BaseModel):
+    ticket_id: int
+    project_id: Union[int, None] = None
+    owner_id: Union[int, None] = None
+    project_name: Union[str, None] = None
+    name: Union[str, None] = None
+    status: Union[TicketStatusEnum, None] = None
+    created: Union[datetime, None] = None
+    updated: Union[datetime, None] = None
+
+    class Config:
+        use_enum_values = True
+
+    @validator('created', 'updated', whole=True)
+    def format_datetime(cls, value):
+        if isinstance(value, datetime):
+            return value.strftime('%Y-%m-%d %H:%M:%S')
+        return value
+
+
+class BoardSummary(BaseModel):
     project_id: Union[int, None] = None
+    project_name: Union[str, None] = None
+    status: Union[TicketStatusEnum, None] = None
+    count: int
+
+    class Config:
+        use_enum_values = True
+
+
+class BoardColumn(BaseModel):
+    status: TicketStatusEnum
+    tickets: List[Ticket]
+
+    class Config:
+        use_enum_values = True
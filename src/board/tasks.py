@@ -0,0 +1,50 @@
+import os
+
+from fastapi_sqlalchemy import db
+from sqlalchemy import select
+
+from src.board import history, idempotency
+from src.board.models import Project, Ticket
+from src.cache import cache
+from src.jobs.queue import task
+from src.sharding import ShardSessions
+
+PURGE_CHUNK_SIZE = int(os.environ.get('PURGE_CHUNK_SIZE', 1000))
+
+
+@task()
+def purge_project(project_id: int, user_id: int = None):
+    # tickets go in short chunked transactions, so huge projects never hold long locks
+    with ShardSessions() as shards:
+        session = shards.for_id(project_id)
+        owner_id = session.query(Project.user_id).filter_by(id=project_id).scalar()
+        while True:
+            chunk = [ticket_id for ticket_id, in session.execute(
+                select(Ticket.id).where(Ticket.project_id == project_id).limit(PURGE_CHUNK_SIZE))]
+            # the deleted events of a chunk are written in its transaction
+            history.record_deleted(session, Ticket.id.in_(chunk), user_id)
+            session.query(Ticket).filter(Ticket.id.in_(chunk)).delete(synchronize_session=False)
+            session.commit()
+            if len(chunk) < PURGE_CHUNK_SIZE:
+                break
+        session.query(Project).filter_by(id=project_id).delete(synchronize_session=False)
+        session.commit()
+    # reads in between still see the tickets that are left, so the cache is invalidated once they are all gone
+    cache.invalidate_from_thread(f"project:{project_id}", f"projects:{owner_id}", "projects:all", "tickets")
+
+
+@task(every=idempotency.IDEMPOTENCY_PURGE_INTERVAL)
+def purge_idempotency_keys():
+    # expired keys are only removed lazily when reused, most never are
+    with ShardSessions() as shards:
+        # profile keys live in the main database, project and ticket keys on the shards
+        for session in [db.session] + (shards.all() if shards.router.sharded else []):
+            idempotency.purge_expired(session, PURGE_CHUNK_SIZE)
+
+
+@task(every=history.PARTITION_CHECK_INTERVAL)
+def create_ticket_event_partitions():
+    # the migration created partitions for two years, this keeps PARTITION_MONTHS_AHEAD of them from then on
+    with ShardSessions() as shards:
+        for session in shards.all():
+            history.ensure_partitions(session)
@@ -0,0 +1,279 @@
+"""Read-through cache of hot read endpoints.
+
+Entries are stored as json under "<versions>:<scope>:<name>", where the versions belong to the namespaces the
+entry depends on (e.g. "project:12"). Writers invalidate a namespace by giving it a new version, entries of the
+old version are never read again and age out. CACHE_BACKEND "memory" keeps entries (and versions) per worker
+process, so a write is only seen by the worker that made it; it suits a single worker, with several use "redis".
+The default is "redis" when CACHE_REDIS_URL is set, otherwise "none" which disables the cache (profile cards
+excepted, see card_cache). When the backend fails the requests are served by their loads, uncached.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Union
+
+import anyio.from_thread
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis' if CACHE_REDIS_URL else 'none')  # "memory", "redis" or "none"
+CACHE_SIZE = int(os.environ.get('CACHE_SIZE', 10000))  # entries of the memory backend
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 30))  # seconds
+CACHE_REDIS_TIMEOUT = float(os.environ.get('CACHE_REDIS_TIMEOUT', 0.5))  # seconds, then requests load uncached
+CACHE_VERSION_TTL = 60 * 60 * 24  # a lost version only costs misses, the new one never matches old entries
+# profile cards of the "none" backend, see card_cache
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 10000))
+PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 30))  # seconds
+
+
+class TTLCache:
+    """Least recently used entries of a single worker process, each one expires ttl seconds after it was set."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Cached values of the keys that are present and fresh, keys without an entry are left out."""
+        now = time.monotonic()
+        found = {}
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            expires, value = entry
+            if expires <= now:
+                del self._entries[key]
+                continue
+            self._entries.move_to_end(key)
+            found[key] = value
+        return found
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class CacheBackend:
+    async def get_many(self, keys: List[str]) -> List[Union[str, None]]:
+        """Stored values in the order of keys, None for missing ones."""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float):
+        raise NotImplementedError
+
+    async def set_many(self, values: Dict[str, str], ttl: float):
+        for key, value in values.items():
+            await self.set(key, value, ttl)
+
+
+class NullBackend(CacheBackend):
+    async def get_many(self, keys: List[str]) -> List[Union[str, None]]:
+        return [None] * len(keys)
+
+    async def set(self, key: str, value: str, ttl: float):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self._entries = TTLCache(maxsize, CACHE_TTL)
+
+    async def get_many(self, keys: List[str]) -> List[Union[str, None]]:
+        found = self._entries.get_many(keys)
+        return [found.get(key) for key in keys]
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._entries.set(key, value, ttl)
+
+
+class RedisBackend(CacheBackend):
+    """Entries shared by all workers and pods."""
+
+    def __init__(self, url: str):
+        # redis is only needed when the shared backend is enabled
+        from redis import asyncio as redis
+        self._client = redis.from_url(url, decode_responses=True, socket_timeout=CACHE_REDIS_TIMEOUT,
+                                      socket_connect_timeout=CACHE_REDIS_TIMEOUT)
+
+    async def get_many(self, keys: List[str]) -> List[Union[str, None]]:
+        return await self._client.mget([f"cache:{key}" for key in keys])
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._client.set(f"cache:{key}", value, ex=max(1, int(ttl)))
+
+    async def set_many(self, values: Dict[str, str], ttl: float):
+        # one round trip
+        async with self._client.pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(f"cache:{key}", value, ex=max(1, int(ttl)))
+            await pipe.execute()
+
+
+def create_backend() -> CacheBackend:
+    if CACHE_BACKEND == "redis":
+        return RedisBackend(CACHE_REDIS_URL or 'redis://localhost:6379/1')
+    if CACHE_BACKEND == "none":
+        return NullBackend()
+    return MemoryBackend()
+
+
+class ReadThroughCache:
+    def __init__(self, backend: CacheBackend = None, ttl: float = CACHE_TTL):
+        self.backend = backend or create_backend()
+        self.ttl = ttl
+        self.counters = {"hits": 0, "misses": 0, "joined": 0, "errors": 0}
+        # key -> future of the load in progress, concurrent misses wait for it instead of querying again
+        self._flights: Dict[str, asyncio.Future] = {}
+
+    async def get_or_load(self, namespaces: List[str], scope: Union[int, str], name: str, load: Callable[[], Any],
+                          ttl: float = None) -> Any:
+        """Cached value, or the json serializable result of load() which is stored for ttl seconds.
+
+        scope is the user (or role) the value was loaded for, exceptions of load() are not cached. load() runs in
+        the threadpool, so the loop keeps serving and concurrent misses of the key wait for its result.
+        """
+        versions = await self._versions(namespaces)
+        if versions is None:
+            return await run_in_threadpool(load)
+        key = f"{':'.join(versions)}:{scope}:{name}"
+        found = await self._get_many([key])
+        if found is None:
+            return await run_in_threadpool(load)
+        cached, = found
+        if cached is not None:
+            self.counters["hits"] += 1
+            return json.loads(cached)
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.counters["joined"] += 1
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+            # the request that was loading went away, load again
+            return await self.get_or_load(namespaces, scope, name, load, ttl)
+
+        self.counters["misses"] += 1
+        flight = self._flights[key] = asyncio.get_event_loop().create_future()
+        try:
+            value = await run_in_threadpool(load)
+            await self._set_many({key: json.dumps(value, default=str)}, self.ttl if ttl is None else ttl)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # retrieved, waiters (if any) get it raised
+            raise
+        else:
+            flight.set_result(value)
+        finally:
+            del self._flights[key]
+        return value
+
+    async def get_many_or_load(self, namespaces: Dict[Hashable, str], scope: Union[int, str], name: str,
+                               load: Callable[[List[Hashable]], Dict[Hashable, Any]],
+                               ttl: float = None) -> Dict[Hashable, Any]:
+        """Batched get_or_load of one value per item, namespaces maps each item to the namespace of its value.
+
+        load(missing items) returns the values of all the items it is given, the missing ones are loaded with a
+        single call in the threadpool. Batches do not join loads in flight.
+        """
+        items = list(namespaces)
+        versions = await self._versions([namespaces[item] for item in items])
+        if versions is None:
+            return await run_in_threadpool(load, items)
+        keys = {item: f"{version}:{scope}:{name}" for item, version in zip(items, versions)}
+        found = await self._get_many([keys[item] for item in items])
+        if found is None:
+            return await run_in_threadpool(load, items)
+        values = {}
+        for item, cached in zip(items, found):
+            if cached is not None:
+                values[item] = json.loads(cached)
+        missing = [item for item in items if item not in values]
+        self.counters["hits"] += len(values)
+        self.counters["misses"] += len(missing)
+        if missing:
+            loaded = await run_in_threadpool(load, missing)
+            await self._set_many({keys[item]: json.dumps(loaded[item], default=str) for item in missing},
+                                 self.ttl if ttl is None else ttl)
+            values.update(loaded)
+        return values
+
+    async def invalidate(self, *namespaces: str):
+        """New versions of the namespaces. Callers have already committed, a failing backend is logged and the
+        entries of the old versions are served until they expire."""
+        await self._set_many({f"version:{namespace}": uuid.uuid4().hex for namespace in namespaces},
+                             CACHE_VERSION_TTL)
+
+    def invalidate_from_thread(self, *namespaces: str):
+        """invalidate() for sync code, such as jobs running in the threadpool."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            anyio.from_thread.run(self.invalidate, *namespaces)
+            return
+        # on the loop itself (jobs run inline without a worker pool), it cannot be waited for
+        asyncio.ensure_future(self.invalidate(*namespaces))
+
+    async def _versions(self, namespaces: List[str]) -> Optional[List[str]]:
+        """Current versions of the namespaces, None when the backend fails."""
+        versions = await self._get_many([f"version:{namespace}" for namespace in namespaces])
+        if versions is None:
+            return None
+        created = {}
+        for i, version in enumerate(versions):
+            if version is None:
+                versions[i] = created[f"version:{namespaces[i]}"] = uuid.uuid4().hex
+        if created:
+            await self._set_many(created, CACHE_VERSION_TTL)
+        return versions
+
+    async def _get_many(self, keys: List[str]) -> Optional[List[Union[str, None]]]:
+        try:
+            return await self.backend.get_many(keys)
+        except Exception:
+            self.counters["errors"] += 1
+            logger.exception("Cache read failed, loading without the cache")
+            return None
+
+    async def _set_many(self, values: Dict[str, str], ttl: float):
+        try:
+            await self.backend.set_many(values, ttl)
+        except Exception:
+            self.counters["errors"] += 1
+            logger.exception("Cache write of %s failed", ", ".join(values))
+
+    def metrics(self) -> dict:
+        return {"backend": type(self.backend).__name__, **self.counters}
+
+
+cache = ReadThroughCache()
+# Profile cards are read on every board render, without a shared backend they are kept in each process for
+# PROFILE_CACHE_TTL. The worker that handles a profile write drops them at once, the others once they expire.
+card_cache = cache if CACHE_BACKEND != "none" else ReadThroughCache(MemoryBackend(PROFILE_CACHE_SIZE),
+                                                                     PROFILE_CACHE_TTL)
+
+
+async def invalidate_profiles(*user_ids: int):
+    namespaces = [f"profile:{user_id}" for user_id in user_ids]
+    await cache.invalidate(*namespaces)
+    if card_cache is not cache:
+        await card_cache.invalidate(*namespaces)
@@ -0,0 +1,160 @@
+import gzip
+import io
+import os
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, responses are only gzipped without it
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
+
+
+class GzipEncoder:
+    encoding = "gzip"
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.file = gzip.GzipFile(mode="wb", fileobj=self.buffer, compresslevel=GZIP_LEVEL)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        self.file.write(data)
+        if flush:
+            self.file.flush()
+        return self._take()
+
+    def finish(self) -> bytes:
+        self.file.close()
+        return self._take()
+
+    def _take(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+
+class BrotliEncoder:
+    encoding = "br"
+
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        compressed = self.compressor.process(data)
+        if flush:
+            compressed += self.compressor.flush()
+        return compressed
+
+    def finish(self) -> bytes:
+        return self.compressor.finish()
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+def select_encoder(accept_encoding: str):
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in encodings:
+        return BrotliEncoder
+    if "gzip" in encodings:
+        return GzipEncoder
+    return None
+
+
+class CompressionMiddleware:
+    """Negotiated br/gzip compression of responses larger than minimum_size.
+
+    Bodies that arrive in one message are compressed whole, streamed bodies are compressed
+    and flushed chunk by chunk so clients still receive them incrementally.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoder_class = select_encoder(Headers(scope=scope).get("accept-encoding", ""))
+        if encoder_class is None:
+            await self.app(scope, receive, send)
+            return
+        await CompressionResponder(self.app, encoder_class, self.minimum_size)(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(self, app, encoder_class, minimum_size: int):
+        self.app = app
+        self.encoder_class = encoder_class
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # hold the headers back until the first body chunk tells us whether to compress
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            # a known small length skips compression even if the body arrives in several chunks
+            self.passthrough = ("content-encoding" in headers or
+                                int(headers.get("content-length", self.minimum_size)) < self.minimum_size)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            if self.start_message is not None:
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            if not more_body and len(body) < self.minimum_size:
+                await self.send(start_message)
+                await self.send(message)
+                return
+            self.encoder = self.encoder_class()
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = self.encoder.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                body = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.send(start_message)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            await self.send(start_message)
+
+        if more_body:
+            await self.send({"type": "http.response.body", "body": self.encoder.compress(body, flush=True),
+                             "more_body": True})
+        else:
+            await self.send({"type": "http.response.body", "body": self.encoder.compress(body) + self.encoder.finish()})
@@ -1,3 +1,16 @@
+import os
+
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
+
+
+def engine_args(db_url: str) -> dict:
+    # every worker process has its own pool, keep workers * (pool size + overflow) under max_connections
+    if db_url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": int(os.environ.get('DB_POOL_SIZE', 5)),
+        "max_overflow": int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        "pool_pre_ping": True,
+    }
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, JSON
+from sqlalchemy import Enum
+from sqlalchemy.sql import func
+
+import enum
+
+from src.db import Base
+
+
+class JobStatusEnum(enum.Enum):
+    pending = "pending"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
+
+class Job(Base):
+    __tablename__ = 'jobs'
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+    status = Column(Enum(JobStatusEnum), nullable=False, default=JobStatusEnum.pending)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    created = Column(DateTime(timezone=True), server_default=func.now())
+    updated = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # workers poll for pending jobs that are due
+    __table_args__ = (Index('ix_jobs_status_run_after', 'status', 'run_after'),)
@@ -0,0 +1,339 @@
+import asyncio
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional
+
+from fastapi_sqlalchemy import db
+from sqlalchemy import and_, event, or_, func
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from src.jobs.models import Job, JobStatusEnum
+
+logger = logging.getLogger(__name__)
+
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'memory')  # "memory" or "postgres"
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_QUEUE_MAXSIZE = int(os.environ.get('JOB_QUEUE_MAXSIZE', 10000))
+JOB_MAX_RETRIES = int(os.environ.get('JOB_MAX_RETRIES', 3))
+JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 2))  # seconds, doubled after every failed attempt
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))  # seconds
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 300))  # seconds before a running job is reclaimed
+JOB_SHUTDOWN_TIMEOUT = float(os.environ.get('JOB_SHUTDOWN_TIMEOUT', 10))  # seconds
+JOB_MAX_BACKOFF = float(os.environ.get('JOB_MAX_BACKOFF', 60))  # seconds between polls while the database fails
+SESSION_KEY = "jobs"
+
+registry: Dict[str, "Task"] = {}
+
+
+class Task:
+    def __init__(self, func: Callable, name: str, max_retries: int, every: Optional[float] = None):
+        self.func = func
+        self.name = name
+        self.max_retries = max_retries
+        self.every = every
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+    def delay(self, **payload):
+        """Schedule the task to run off the request path once the transaction of db.session commits.
+
+        The job is dropped if that transaction rolls back, so call it before committing the writes it depends on.
+        """
+        queue.enqueue(db.session, self.name, payload)
+
+
+def task(name: str = None, max_retries: int = JOB_MAX_RETRIES, every: float = None):
+    """Register a job function, with every (seconds) it is also enqueued periodically by every worker process.
+
+    Periodic tasks take no arguments and have to be safe to run several times in a row.
+    """
+    def decorator(func):
+        registered = Task(func, name or f"{func.__module__}.{func.__name__}", max_retries, every)
+        registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def run_task(name: str, payload: dict):
+    # jobs run outside of the request, so every run gets a session of its own
+    with db():
+        registry[name](**payload)
+
+
+def schedule_task(name: str):
+    with db():
+        queue.enqueue(db.session, name, {})
+        db.session.commit()
+
+
+def can_retry(name: str, attempts: int) -> bool:
+    registered = registry.get(name)
+    return registered is not None and attempts <= registered.max_retries
+
+
+def retry_delay(attempts: int) -> float:
+    return JOB_RETRY_DELAY * 2 ** (attempts - 1)
+
+
+class JobQueue(ABC):
+    backend = None
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.in_flight = 0
+        self.counters = {"enqueued": 0, "processed": 0, "retried": 0, "failed": 0}
+        self._workers = []
+        self._schedulers = []
+        self._running = False
+
+    @abstractmethod
+    def enqueue(self, session: Session, name: str, payload: dict):
+        """Add the job to the session's transaction, it runs once that commits and never if it rolls back."""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """Jobs waiting for a worker."""
+
+    @abstractmethod
+    async def _worker(self):
+        """Run jobs until cancelled."""
+
+    async def _schedule(self, registered: Task):
+        while True:
+            await asyncio.sleep(registered.every)
+            try:
+                await run_in_threadpool(schedule_task, registered.name)
+            except Exception:
+                logger.exception("Scheduling %s failed", registered.name)
+
+    async def start(self):
+        self._running = True
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._schedulers = [asyncio.create_task(self._schedule(registered))
+                            for registered in registry.values() if registered.every]
+
+    async def stop_schedulers(self):
+        for scheduler in self._schedulers:
+            scheduler.cancel()
+        await asyncio.gather(*self._schedulers, return_exceptions=True)
+        self._schedulers = []
+
+    async def stop(self):
+        self._running = False
+        await self.stop_schedulers()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def execute(self, name: str, payload: dict) -> Optional[Exception]:
+        self.in_flight += 1
+        try:
+            await run_in_threadpool(run_task, name, payload)
+        except Exception as e:
+            logger.exception("Job %s failed", name)
+            return e
+        finally:
+            self.in_flight -= 1
+        self.counters["processed"] += 1
+        return None
+
+    def metrics(self) -> dict:
+        return {
+            "backend": self.backend,
+            "workers": self.workers,
+            "running": self._running,
+            "depth": self.depth(),
+            "in_flight": self.in_flight,
+            **self.counters,
+        }
+
+
+class MemoryJobQueue(JobQueue):
+    """asyncio worker pool, jobs are lost if the process dies."""
+    backend = "memory"
+
+    def __init__(self, workers: int, maxsize: int):
+        super().__init__(workers)
+        self.maxsize = maxsize
+        self.counters["dropped"] = 0
+        self._queue = None
+        self._loop = None
+
+    def enqueue(self, session: Session, name: str, payload: dict):
+        # handed to the workers by submit() after the commit, the transaction is begun so a rollback sees the job
+        if not session.in_transaction():
+            session.begin()
+        session.info.setdefault(SESSION_KEY, []).append((name, payload))
+
+    def submit(self, name: str, payload: dict):
+        if self._queue is None:
+            # no worker pool (e.g. the app was not started with lifespan events), run inline
+            run_task(name, payload)
+            return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is not self._loop:
+            # asyncio.Queue is not thread safe, jobs enqueued from the threadpool are handed over to the loop
+            self._loop.call_soon_threadsafe(self._enqueue, name, payload)
+            return
+        self._enqueue(name, payload)
+
+    def _enqueue(self, name: str, payload: dict):
+        if self._put(name, payload, 0):
+            self.counters["enqueued"] += 1
+
+    def _put(self, name: str, payload: dict, attempts: int) -> bool:
+        try:
+            self._queue.put_nowait((name, payload, attempts))
+        except asyncio.QueueFull:
+            self.counters["dropped"] += 1
+            logger.error("Job queue is full, dropping %s", name)
+            return False
+        return True
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        await super().start()
+
+    async def stop(self):
+        await self.stop_schedulers()
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), JOB_SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Job queue stopped with %s jobs left", self._queue.qsize())
+        await super().stop()
+
+    async def _worker(self):
+        while True:
+            name, payload, attempts = await self._queue.get()
+            try:
+                error = await self.execute(name, payload)
+                if error is not None:
+                    self._retry(name, payload, attempts + 1)
+            finally:
+                self._queue.task_done()
+
+    def _retry(self, name: str, payload: dict, attempts: int):
+        if not can_retry(name, attempts):
+            self.counters["failed"] += 1
+            return
+        self.counters["retried"] += 1
+        asyncio.get_event_loop().call_later(retry_delay(attempts), self._put, name, payload, attempts)
+
+
+class PostgresJobQueue(JobQueue):
+    """Durable queue on the jobs table, workers claim rows with SELECT ... FOR UPDATE SKIP LOCKED."""
+    backend = "postgres"
+
+    def __init__(self, workers: int, poll_interval: float):
+        super().__init__(workers)
+        self.poll_interval = poll_interval
+
+    def enqueue(self, session: Session, name: str, payload: dict):
+        # the row is part of the caller's transaction, workers see it once that commits
+        session.add(Job(name=name, payload=payload))
+        self.counters["enqueued"] += 1
+
+    def depth(self) -> int:
+        return db.session.query(func.count(Job.id)).filter(Job.status == JobStatusEnum.pending).scalar()
+
+    async def stop(self):
+        self._running = False
+        await self.stop_schedulers()
+        if self._workers:
+            # let the workers finish the jobs they hold before cancelling them
+            await asyncio.wait(self._workers, timeout=JOB_SHUTDOWN_TIMEOUT)
+        await super().stop()
+
+    async def _worker(self):
+        failures = 0
+        while self._running:
+            try:
+                claimed = await self._process()
+            except Exception:
+                # database outages must not end the worker, back off and poll again
+                failures += 1
+                logger.exception("Job worker failed to reach the database")
+                await asyncio.sleep(min(self.poll_interval * 2 ** failures, JOB_MAX_BACKOFF))
+                continue
+            failures = 0
+            if not claimed:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _process(self) -> bool:
+        claimed = await run_in_threadpool(self._claim)
+        if claimed is None:
+            return False
+        job_id, name, payload, attempts = claimed
+        error = await self.execute(name, payload)
+        if error is None:
+            values = {"status": JobStatusEnum.done}
+        elif can_retry(name, attempts):
+            self.counters["retried"] += 1
+            values = {"status": JobStatusEnum.pending, "last_error": repr(error),
+                      "run_after": datetime.now(timezone.utc) + timedelta(seconds=retry_delay(attempts))}
+        else:
+            self.counters["failed"] += 1
+            values = {"status": JobStatusEnum.failed, "last_error": repr(error)}
+        # a failure to record the outcome leaves the job running, it is reclaimed after JOB_LOCK_TIMEOUT
+        await run_in_threadpool(self._finish, job_id, values)
+        return True
+
+    def _claim(self):
+        with db():
+            stale = func.now() - timedelta(seconds=JOB_LOCK_TIMEOUT)
+            job = (db.session.query(Job)
+                   .filter(or_(and_(Job.status == JobStatusEnum.pending, Job.run_after <= func.now()),
+                               and_(Job.status == JobStatusEnum.running, Job.locked_at < stale)))
+                   .order_by(Job.id)
+                   .with_for_update(skip_locked=True)
+                   .first())
+            if job is None:
+                return None
+            job.status = JobStatusEnum.running
+            job.locked_at = func.now()
+            job.attempts += 1
+            claimed = (job.id, job.name, job.payload, job.attempts)
+            db.session.commit()
+            return claimed
+
+    def _finish(self, job_id: int, values: dict):
+        values["locked_at"] = None
+        with db():
+            db.session.query(Job).filter_by(id=job_id).update(values, synchronize_session=False)
+            db.session.commit()
+
+
+@event.listens_for(Session, "after_commit")
+def submit_jobs(session):
+    # only the memory queue keeps jobs in the session, the postgres one commits them as rows
+    for name, payload in session.info.pop(SESSION_KEY, ()):
+        queue.submit(name, payload)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def discard_jobs(session, transaction):
+    # committed jobs are gone by now, what is left belongs to a transaction that was rolled back or closed
+    if transaction.parent is None:
+        session.info.pop(SESSION_KEY, None)
+
+
+def create_queue() -> JobQueue:
+    if JOB_BACKEND == "postgres":
+        return PostgresJobQueue(JOB_WORKERS, JOB_POLL_INTERVAL)
+    return MemoryJobQueue(JOB_WORKERS, JOB_QUEUE_MAXSIZE)
+
+
+queue = create_queue()
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from src.auth.dependencies import RoleChecker
+from src.jobs.queue import queue
+
+router = APIRouter(prefix="/jobs")
+
+admin_permission = RoleChecker(["admin"])
+
+
+@router.get('/metrics', summary='Get background job queue metrics', dependencies=[Depends(admin_permission)], tags=['jobs'])
+async def get_metrics():
+    return queue.metrics()
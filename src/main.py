@@ -3,6 +3,13 @@ from fastapi_sqlalchemy import DBSessionMiddleware
 
 from src.auth.router import router as auth_router
 from src.board.router import router as board_router
+from src.jobs.router import router as jobs_router
+from src.jobs.queue import queue as job_queue
+from src.auth.bulk import shutdown_hash_pool
+from src.db import engine_args
+from src.compression import CompressionMiddleware
+from src.ratelimit import RATE_LIMIT_ENABLED, RateLimitMiddleware, ConcurrencyLimitMiddleware
+from src.profiling.profiler import PROFILING_ENABLED, ProfilingMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
@@ -23,6 +30,14 @@ tags_metadata = [
         "name": "tickets",
         "description": "Tickets endpoints",
     },
+    {
+        "name": "jobs",
+        "description": "Background jobs endpoints",
+    },
+    {
+        "name": "debug",
+        "description": "Profiling endpoints, only present with PROFILING_ENABLED",
+    },
 ]
 
 app = FastAPI(openapi_tags=tags_metadata)
@@ -30,7 +45,15 @@ app = FastAPI(openapi_tags=tags_metadata)
 
 origins = ['*']
 
-app.add_middleware(DBSessionMiddleware, db_url=os.environ['DATABASE_URL'])
+if PROFILING_ENABLED:
+    # innermost, so timings and profiles cover the endpoint rather than compression and rate limiting
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(DBSessionMiddleware, db_url=os.environ['DATABASE_URL'], engine_args=engine_args(os.environ['DATABASE_URL']))
+app.add_middleware(CompressionMiddleware)
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+# right inside CORS, so shed requests are cheap and still carry CORS headers
+app.add_middleware(ConcurrencyLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -40,4 +63,22 @@ app.add_middleware(
 )
 app.include_router(board_router)
 app.include_router(auth_router)
+app.include_router(jobs_router)
+if PROFILING_ENABLED:
+    from src.profiling.router import router as debug_router
+    app.include_router(debug_router)
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+
 
+@app.on_event("shutdown")
+async def stop_hash_pool():
+    shutdown_hash_pool()
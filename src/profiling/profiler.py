@@ -0,0 +1,215 @@
+"""Opt-in profiling of a running worker, enabled by PROFILING_ENABLED.
+
+- route timings: every request is timed and aggregated by route template
+- request profiles: a request carrying the X-Profile header with PROFILING_TOKEN (required once profiling is
+  enabled) as value runs under cProfile, the report is kept under the id returned in the X-Profile-Id response header
+- sampling: a thread records the stacks of all threads every few milliseconds for a given number of seconds,
+  results are collapsed stacks ("frame;frame;frame count" lines) as read by flamegraph.pl and speedscope
+
+Everything is per worker process. cProfile sees the event loop thread only, so sync endpoints running in the
+threadpool show up in samples but not in request profiles, and coroutines of concurrent requests interleave
+with the profiled one.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, deque
+from typing import Union
+
+from starlette.datastructures import MutableHeaders
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '').encode("latin-1")
+if PROFILING_ENABLED and not PROFILING_TOKEN:
+    # profiling costs CPU on every profiled request, it must not be open to anyone
+    raise RuntimeError("PROFILING_ENABLED requires PROFILING_TOKEN")
+PROFILING_KEEP = int(os.environ.get('PROFILING_KEEP', 20))  # request profiles kept per worker
+PROFILING_MAX_ROUTES = 1000  # requests that match no route are aggregated by path, keep that bounded
+PROFILE_HEADER = b"x-profile"
+
+
+class RouteStats:
+    def __init__(self, samples: int = 1000):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=samples)
+
+    def add(self, duration: float, error: bool):
+        self.count += 1
+        self.errors += error
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.recent.append(duration)
+
+    def summary(self) -> dict:
+        recent = sorted(self.recent)
+
+        def percentile(p):
+            return round(recent[min(len(recent) - 1, int(len(recent) * p))] * 1000, 2) if recent else None
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(self.total / self.count * 1000, 2) if self.count else None,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class RouteTimings:
+    def __init__(self):
+        self.routes = {}
+
+    def add(self, route: str, duration: float, error: bool):
+        stats = self.routes.get(route)
+        if stats is None:
+            if len(self.routes) >= PROFILING_MAX_ROUTES:
+                route = "other"
+            stats = self.routes.setdefault(route, RouteStats())
+        stats.add(duration, error)
+
+    def summary(self) -> dict:
+        return {route: stats.summary()
+                for route, stats in sorted(self.routes.items(), key=lambda item: -item[1].total)}
+
+    def reset(self):
+        self.routes = {}
+
+
+class RequestProfiles:
+    def __init__(self, keep: int = PROFILING_KEEP):
+        self.keep = keep
+        self.profiles = OrderedDict()
+        self.active = False
+
+    def add(self, profile_id: str, method: str, path: str, duration: float, profile: cProfile.Profile):
+        self.profiles[profile_id] = {"id": profile_id, "method": method, "path": path,
+                                     "duration_ms": round(duration * 1000, 2), "created": time.time(),
+                                     "stats": pstats.Stats(profile)}
+        if len(self.profiles) > self.keep:
+            self.profiles.popitem(last=False)
+
+    def summary(self) -> list:
+        return [{key: value for key, value in profile.items() if key != "stats"}
+                for profile in reversed(self.profiles.values())]
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> Union[str, None]:
+        profile = self.profiles.get(profile_id)
+        if profile is None:
+            return None
+        stream = io.StringIO()
+        stats = profile["stats"]
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class Sampler:
+    """Samples the stacks of every thread but its own, sys._current_frames costs no tracing overhead."""
+
+    def __init__(self):
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.until = None
+        self.interval = None
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval: float) -> bool:
+        if self.running:
+            return False
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.time()
+        self.until = self.started + seconds
+        self.interval = interval
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self.until = time.time()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while time.time() < self.until:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def status(self) -> dict:
+        return {"running": self.running, "started": self.started, "until": self.until,
+                "interval": self.interval, "samples": self.samples, "stacks": len(self.stacks)}
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+route_timings = RouteTimings()
+request_profiles = RequestProfiles()
+sampler = Sampler()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = None
+        header = dict(scope["headers"]).get(PROFILE_HEADER)
+        # one profile at a time, cProfile cannot nest
+        if header is not None and not request_profiles.active and hmac.compare_digest(header, PROFILING_TOKEN):
+            profile = cProfile.Profile()
+        status_code = 500
+        profile_id = None
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if profile is not None:
+                    # the report is stored once the response is done, its id can be handed out already
+                    MutableHeaders(raw=message["headers"])["X-Profile-Id"] = profile_id
+            await send(message)
+
+        if profile is not None:
+            profile_id = uuid.uuid4().hex[:12]
+            request_profiles.active = True
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                request_profiles.active = False
+                request_profiles.add(profile_id, scope["method"], scope["path"], duration, profile)
+            route = scope.get("route")
+            route_timings.add(f"{scope['method']} {route.path if route is not None else scope['path']}",
+                              duration, status_code >= 500)
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import PlainTextResponse
+
+from src.auth.dependencies import RoleChecker
+from src.profiling.profiler import request_profiles, route_timings, sampler
+
+router = APIRouter(prefix="/debug")
+
+admin_permission = RoleChecker(["admin"])
+
+
+@router.get('/routes', summary='Get request timings per route', dependencies=[Depends(admin_permission)],
+            tags=['debug'])
+async def get_route_timings():
+    return route_timings.summary()
+
+
+@router.delete('/routes', summary='Reset request timings', status_code=status.HTTP_204_NO_CONTENT,
+               dependencies=[Depends(admin_permission)], tags=['debug'])
+async def reset_route_timings():
+    route_timings.reset()
+    return None
+
+
+@router.get('/profiles', summary='Get list of request profiles, newest first', dependencies=[Depends(admin_permission)],
+            tags=['debug'])
+async def get_profiles():
+    return request_profiles.summary()
+
+
+@router.get('/profiles/{profile_id}', summary='Get cProfile report of a request', response_class=PlainTextResponse,
+            dependencies=[Depends(admin_permission)], tags=['debug'])
+async def get_profile_report(profile_id: str,
+                             sort: str = Query("cumulative", regex="^(cumulative|tottime|ncalls)$"),
+                             limit: int = Query(50, ge=1, le=1000)):
+    report = request_profiles.report(profile_id, sort, limit)
+    if report is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+    return report
+
+
+@router.post('/sampler', summary='Sample the stacks of all threads for a number of seconds',
+             status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(admin_permission)], tags=['debug'])
+async def start_sampler(seconds: float = Query(10, gt=0, le=300), interval_ms: float = Query(5, ge=1, le=1000)):
+    if not sampler.start(seconds, interval_ms / 1000):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Sampler is already running"
+        )
+    return sampler.status()
+
+
+@router.delete('/sampler', summary='Stop the sampler', status_code=status.HTTP_204_NO_CONTENT,
+               dependencies=[Depends(admin_permission)], tags=['debug'])
+async def stop_sampler():
+    sampler.stop()
+    return None
+
+
+@router.get('/sampler', summary='Get sampler status', dependencies=[Depends(admin_permission)], tags=['debug'])
+async def get_sampler():
+    return sampler.status()
+
+
+@router.get('/sampler/flamegraph', summary='Get sampled stacks in collapsed format for flamegraph tools',
+            response_class=PlainTextResponse, dependencies=[Depends(admin_permission)], tags=['debug'])
+async def get_flamegraph():
+    return sampler.collapsed()
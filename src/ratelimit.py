@@ -0,0 +1,175 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from jose.exceptions import JWTError
+from starlette.responses import JSONResponse
+
+from src.utils import ALGORITHM, JWT_SECRET_KEY, get_jwt
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # "memory" or "redis"
+RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', 200))  # concurrent requests per worker before shedding
+
+
+class Budget(NamedTuple):
+    rate: float  # tokens refilled per second
+    burst: int  # bucket size
+    role: Optional[str] = None  # only requests of the role are charged to it, the others to the default budget
+
+
+DEFAULT_BUDGET = Budget(rate=20, burst=40)
+
+ROUTE_BUDGETS: Dict[Tuple[str, str], Budget] = {
+    # bcrypt bound
+    ("POST", "/auth/login"): Budget(rate=10 / 60, burst=10),
+    ("POST", "/auth/signup"): Budget(rate=5 / 60, burst=5),
+    ("PATCH", "/auth/my_user"): Budget(rate=10 / 60, burst=10),
+    # full table reads, other users only read their own projects
+    ("GET", "/board/tickets"): Budget(rate=1, burst=5, role="admin"),
+    ("GET", "/board/projects"): Budget(rate=1, burst=5, role="admin"),
+}
+
+
+class RateLimitBackend:
+    async def take(self, key: str, budget: Budget) -> float:
+        """Take a token from the bucket, return 0 on success or the seconds until a token is available."""
+        raise NotImplementedError
+
+
+class MemoryBackend(RateLimitBackend):
+    """Buckets of a single worker process, least recently used keys are evicted past max_keys."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, budget: Budget) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (budget.burst, now))
+        tokens = min(budget.burst, tokens + (now - updated) * budget.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / budget.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class RedisBackend(RateLimitBackend):
+    """Buckets shared by all workers and pods, refilled atomically by a script on the redis clock."""
+
+    SCRIPT = """
+    local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens, updated = tonumber(bucket[1]), tonumber(bucket[2])
+    if tokens == nil then
+        tokens, updated = burst, now
+    end
+    tokens = math.min(burst, tokens + (now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate))
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        # redis is only needed when the shared backend is enabled
+        from redis import asyncio as redis
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def take(self, key: str, budget: Budget) -> float:
+        return float(await self._script(keys=[f"ratelimit:{key}"], args=[budget.rate, budget.burst]))
+
+
+def create_backend() -> RateLimitBackend:
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisBackend(RATE_LIMIT_REDIS_URL)
+    return MemoryBackend()
+
+
+def get_identity(scope) -> Tuple[str, Optional[str]]:
+    """Bucket owner of the request and the role of its user, None for anonymous requests.
+
+    Anonymous requests are keyed on the client ip, behind a proxy it comes from X-Forwarded-For of the
+    FORWARDED_ALLOW_IPS addresses (see gunicorn.conf.py).
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    claims = get_jwt().decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
+                    return "user:" + claims["sub"], claims.get("role")
+                except (JWTError, KeyError):
+                    break
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown"), None
+
+
+class RateLimitMiddleware:
+    """Token bucket per user (or client ip for anonymous requests) and route."""
+
+    def __init__(self, app, backend: RateLimitBackend = None, budgets: Dict[Tuple[str, str], Budget] = None,
+                 default_budget: Budget = DEFAULT_BUDGET):
+        self.app = app
+        self.backend = backend or create_backend()
+        self.budgets = ROUTE_BUDGETS if budgets is None else budgets
+        self.default_budget = default_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        identity, role = get_identity(scope)
+        budget = self.budgets.get(route)
+        if budget and budget.role is not None and budget.role != role:
+            budget = None
+        bucket = f"{route[0]} {route[1]}" if budget else "*"
+        wait = await self.backend.take(f"{identity}:{bucket}", budget or self.default_budget)
+        if wait > 0:
+            response = JSONResponse({"detail": "Too Many Requests"}, status_code=429,
+                                    headers={"Retry-After": str(math.ceil(wait))})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class ConcurrencyLimitMiddleware:
+    """Sheds requests with 503 once max_in_flight requests are being served, before latency collapses."""
+
+    def __init__(self, app, max_in_flight: int = MAX_IN_FLIGHT, retry_after: int = 1):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight >= self.max_in_flight:
+            response = JSONResponse({"detail": "Service Unavailable"}, status_code=503,
+                                    headers={"Retry-After": str(self.retry_after)})
+            await response(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
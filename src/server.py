@@ -0,0 +1,16 @@
+from importlib.util import find_spec
+
+from uvicorn.workers import UvicornWorker as BaseUvicornWorker
+
+
+def is_installed(module: str) -> bool:
+    return find_spec(module) is not None
+
+
+class UvicornWorker(BaseUvicornWorker):
+    # uvloop and httptools come with requirements/production.txt, fall back to the pure python stack without them
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if is_installed("uvloop") else "asyncio",
+        "http": "httptools" if is_installed("httptools") else "h11",
+        "lifespan": "on",
+    }
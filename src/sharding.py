@@ -0,0 +1,188 @@
+"""Routing of projects and their tickets to shard databases by project owner.
+
+SHARD_DATABASE_URLS is a comma separated list of database urls, owners are spread over them by id
+(SHARD_OWNERS pins single owners, e.g. "12:1,40:2"). Users and profiles stay in DATABASE_URL.
+Without SHARD_DATABASE_URLS everything lives in DATABASE_URL and the request session is used.
+
+Every shard hands out ids from its own range of SHARD_ID_RANGE ids, so a project or ticket id
+alone tells which shard holds it. Prepare shards with
+
+    python -m src.sharding init
+
+after running the migrations against every postgres shard (sqlite shards get their tables created).
+"""
+import heapq
+import os
+import sys
+from itertools import islice
+from typing import Callable, Dict, List, Union
+
+from fastapi import HTTPException, status
+from fastapi_sqlalchemy import db
+from sqlalchemy import MetaData, create_engine, event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Query, Session, sessionmaker
+
+from src.db import Base, engine_args
+
+SHARD_DATABASE_URLS = [url.strip() for url in os.environ.get('SHARD_DATABASE_URLS', '').split(',') if url.strip()]
+SHARD_OWNERS = dict(tuple(int(part) for part in item.split(':'))
+                    for item in os.environ.get('SHARD_OWNERS', '').split(',') if item)
+SHARD_ID_RANGE = int(os.environ.get('SHARD_ID_RANGE', 10 ** 8))
+
+# tables whose ids are allocated per shard range
+SHARDED_TABLES = ['projects', 'tickets']
+
+
+class ShardRouter:
+    def __init__(self, urls: List[str], owners: Dict[int, int], id_range: int):
+        self.urls = urls
+        self.owners = owners
+        self.id_range = id_range
+        self._engines = None
+        self._sessionmakers = None
+
+    @property
+    def sharded(self) -> bool:
+        return bool(self.urls)
+
+    def shard_for_owner(self, owner_id: Union[int, None]) -> int:
+        if owner_id is None:
+            return 0
+        return self.owners.get(owner_id, owner_id % len(self.urls))
+
+    def shard_for_id(self, object_id: int) -> int:
+        return min(max(object_id - 1, 0) // self.id_range, len(self.urls) - 1)
+
+    def engine(self, shard: int) -> Engine:
+        # engines are created on first use, inside the worker process
+        if self._engines is None:
+            self._engines = [create_shard_engine(url) for url in self.urls]
+            self._sessionmakers = [sessionmaker(bind=engine) for engine in self._engines]
+        return self._engines[shard]
+
+    def create_session(self, shard: int) -> Session:
+        self.engine(shard)
+        return self._sessionmakers[shard]()
+
+
+def enable_foreign_keys(dbapi_connection, connection_record):
+    # sqlite enforces foreign keys, ON DELETE CASCADE included, only when asked to on every connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def create_shard_engine(url: str) -> Engine:
+    engine = create_engine(url, **engine_args(url))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", enable_foreign_keys)
+    return engine
+
+
+def shard_metadata() -> MetaData:
+    """The tables without their foreign keys to users, which live in the main database."""
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    for table in metadata.sorted_tables:
+        for constraint in [constraint for constraint in table.foreign_key_constraints
+                           if constraint.referred_table.name == "users"]:
+            table.constraints.discard(constraint)
+            for column in constraint.columns:
+                column.foreign_keys.difference_update(constraint.elements)
+    return metadata
+
+
+shard_router = ShardRouter(SHARD_DATABASE_URLS, SHARD_OWNERS, SHARD_ID_RANGE)
+
+
+class ShardSessions:
+    """Sessions of one request or job, opened per shard on demand."""
+
+    def __init__(self, router: ShardRouter = shard_router):
+        self.router = router
+        self._sessions = {}
+
+    def session(self, shard: int) -> Session:
+        if not self.router.sharded:
+            return db.session
+        if shard not in self._sessions:
+            self._sessions[shard] = self.router.create_session(shard)
+        return self._sessions[shard]
+
+    def for_owner(self, owner_id: Union[int, None]) -> Session:
+        return self.session(self.router.shard_for_owner(owner_id) if self.router.sharded else 0)
+
+    def for_id(self, object_id: int) -> Session:
+        return self.session(self.router.shard_for_id(object_id) if self.router.sharded else 0)
+
+    def all(self) -> List[Session]:
+        if not self.router.sharded:
+            return [db.session]
+        return [self.session(shard) for shard in range(len(self.router.urls))]
+
+    def check_same_shard(self, session: Session, other: Session):
+        # sessions are opened once per shard, so different sessions mean different shards
+        if session is not other:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Moving data to an owner on another shard is not supported"
+            )
+
+    def close(self):
+        for session in self._sessions.values():
+            session.close()
+        self._sessions = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_shards():
+    with ShardSessions() as shards:
+        yield shards
+
+
+def merge_pages(queries: List[Query], key: Callable, offset: int = 0, limit: Union[int, None] = None) -> list:
+    """One page out of per-shard queries that are each ordered by key."""
+    if len(queries) == 1:
+        return queries[0].offset(offset).limit(limit).all()
+    stop = None if limit is None else offset + limit
+    # every shard can contribute at most offset + limit rows to the page
+    shard_rows = [query.limit(stop).all() for query in queries]
+    return list(islice(heapq.merge(*shard_rows, key=key), offset, stop))
+
+
+def init_shards(router: ShardRouter = shard_router):
+    for shard, url in enumerate(router.urls):
+        engine = router.engine(shard)
+        first_id = shard * router.id_range
+        with engine.begin() as connection:
+            if engine.dialect.name == "sqlite":
+                shard_metadata().create_all(connection)
+                for table in SHARDED_TABLES:
+                    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :table"), {"table": table})
+                    connection.execute(text(f"INSERT INTO sqlite_sequence (name, seq) "
+                                            f"SELECT :table, max(:first_id, coalesce(max(id), 0)) FROM {table}"),
+                                       {"table": table, "first_id": first_id})
+            else:
+                # users live in the main database, shards cannot reference them
+                connection.execute(text("ALTER TABLE projects DROP CONSTRAINT IF EXISTS projects_user_id_fkey"))
+                connection.execute(text("ALTER TABLE idempotency_keys "
+                                        "DROP CONSTRAINT IF EXISTS idempotency_keys_user_id_fkey"))
+                for table in SHARDED_TABLES:
+                    connection.execute(text(f"SELECT setval('{table}_id_seq', "
+                                            f"greatest(:first_id, (SELECT coalesce(max(id), 0) FROM {table})) + 1, false)"),
+                                       {"first_id": first_id})
+        print(f"shard {shard}: ids from {first_id + 1} ({url})")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["init"] or not shard_router.sharded:
+        sys.exit("usage: SHARD_DATABASE_URLS=url,url python -m src.sharding init")
+    from src.board import models  # registers the tables with Base.metadata
+    init_shards()
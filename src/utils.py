@@ -1,8 +1,7 @@
-from passlib.context import CryptContext
 import os
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Union, Any
-from jose import jwt
 
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # 30 minutes
@@ -11,25 +10,39 @@ ALGORITHM = "HS256"
 JWT_SECRET_KEY = os.environ['JWT_SECRET_KEY']   # should be kept secret
 JWT_REFRESH_SECRET_KEY = os.environ['JWT_REFRESH_SECRET_KEY']    # should be kept secret
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+@lru_cache()
+def get_password_context():
+    # passlib and its bcrypt backend are slow to import, load them on first use instead of at startup
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def get_jwt():
+    # jose.jwt imports its cryptography backends, defer that until the first token
+    from jose import jwt
+    return jwt
 
 
 def get_hashed_password(password: str) -> str:
-    return password_context.hash(password)
+    return get_password_context().hash(password)
 
 
 def verify_password(password: str, hashed_pass: str) -> bool:
-    return password_context.verify(password, hashed_pass)
+    return get_password_context().verify(password, hashed_pass)
 
 
-def create_access_token(subject: Union[str, Any], expires_delta: int = None) -> str:
+def create_access_token(subject: Union[str, Any], expires_delta: int = None, role: str = None) -> str:
     if expires_delta is not None:
         expires_delta = datetime.utcnow() + expires_delta
     else:
         expires_delta = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode = {"exp": expires_delta, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, ALGORITHM)
+    if role is not None:
+        # read by the rate limiter, which runs before the user is loaded
+        to_encode["role"] = role
+    encoded_jwt = get_jwt().encode(to_encode, JWT_SECRET_KEY, ALGORITHM)
     return encoded_jwt
 
 
@@ -40,7 +53,7 @@ def create_refresh_token(subject: Union[str, Any], expires_delta: int = None) ->
         expires_delta = datetime.utcnow() + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
 
     to_encode = {"exp": expires_delta, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, JWT_REFRESH_SECRET_KEY, ALGORITHM)
+    encoded_jwt = get_jwt().encode(to_encode, JWT_REFRESH_SECRET_KEY, ALGORITHM)
     return encoded_jwt
 
 
@@ -55,3 +68,8 @@ def connect_to_db():
     session = Session()
     return session
 
+
+
+def to_columns(items: list, schema, fields: list = None) -> dict:
+    # columnar encoding of a list response, every field name is sent once instead of once per item
+    return {field: [getattr(item, field) for item in items] for field in fields or schema.__fields__}
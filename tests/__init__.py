@@ -0,0 +1,5 @@
+import os
+
+# src.utils reads the token secrets on import
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+os.environ.setdefault("JWT_REFRESH_SECRET_KEY", "test-refresh")
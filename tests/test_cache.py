@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import unittest
+
+from src.cache import CacheBackend, ReadThroughCache
+
+
+class FakeBackend(CacheBackend):
+    """Dict backend that records the keys written, entries never expire."""
+
+    def __init__(self):
+        self.entries = {}
+        self.writes = []
+
+    async def get_many(self, keys):
+        return [self.entries.get(key) for key in keys]
+
+    async def set(self, key, value, ttl):
+        self.entries[key] = value
+        self.writes.append(key)
+
+
+class DownBackend(CacheBackend):
+    """Backend whose server cannot be reached."""
+
+    async def get_many(self, keys):
+        raise ConnectionError("cache down")
+
+    async def set(self, key, value, ttl):
+        raise ConnectionError("cache down")
+
+
+class Loader:
+    """load() callable counting its calls, blocks until released when gated."""
+
+    def __init__(self, value, gated=False):
+        self.value = value
+        self.calls = 0
+        self.release = threading.Event()
+        if not gated:
+            self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.release.wait(5)
+        return self.value
+
+
+class VersionedInvalidationTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = FakeBackend()
+        self.cache = ReadThroughCache(self.backend)
+
+    async def test_hit_after_load(self):
+        load = Loader({"name": "p1"})
+        self.assertEqual(await self.cache.get_or_load(["project:1"], 1, "project", load), {"name": "p1"})
+        self.assertEqual(await self.cache.get_or_load(["project:1"], 1, "project", load), {"name": "p1"})
+        self.assertEqual(load.calls, 1)
+        self.assertEqual(self.cache.counters["hits"], 1)
+
+    async def test_invalidate_reloads(self):
+        await self.cache.get_or_load(["project:1"], 1, "project", Loader("old"))
+        await self.cache.invalidate("project:1")
+        load = Loader("new")
+        self.assertEqual(await self.cache.get_or_load(["project:1"], 1, "project", load), "new")
+        self.assertEqual(load.calls, 1)
+
+    async def test_invalidate_one_of_several_namespaces(self):
+        await self.cache.get_or_load(["tickets", "ticket:1"], 1, "ticket", Loader("old"))
+        await self.cache.invalidate("tickets")
+        self.assertEqual(await self.cache.get_or_load(["tickets", "ticket:1"], 1, "ticket", Loader("new")), "new")
+
+    async def test_invalidate_leaves_other_namespaces(self):
+        await self.cache.get_or_load(["project:1"], 1, "project", Loader("p1"))
+        await self.cache.get_or_load(["project:2"], 1, "project", Loader("p2"))
+        await self.cache.invalidate("project:1")
+        load = Loader("reloaded")
+        self.assertEqual(await self.cache.get_or_load(["project:2"], 1, "project", load), "p2")
+        self.assertEqual(load.calls, 0)
+
+    async def test_scopes_are_separate(self):
+        await self.cache.get_or_load(["projects:all"], "admin", "projects", Loader(["p1", "p2"]))
+        self.assertEqual(await self.cache.get_or_load(["projects:all"], 1, "projects", Loader(["p1"])), ["p1"])
+
+    async def test_lost_version_never_matches_old_entries(self):
+        await self.cache.get_or_load(["project:1"], 1, "project", Loader("old"))
+        del self.backend.entries["version:project:1"]
+        self.assertEqual(await self.cache.get_or_load(["project:1"], 1, "project", Loader("new")), "new")
+
+    async def test_errors_are_not_cached(self):
+        def fail():
+            raise ValueError("database down")
+
+        with self.assertRaises(ValueError):
+            await self.cache.get_or_load(["project:1"], 1, "project", fail)
+        self.assertEqual(await self.cache.get_or_load(["project:1"], 1, "project", Loader("p1")), "p1")
+
+    async def test_many_loads_missing_items_once(self):
+        calls = []
+
+        def load(missing):
+            calls.append(missing)
+            return {user_id: {"user_id": user_id} for user_id in missing}
+
+        namespaces = {user_id: f"profile:{user_id}" for user_id in (1, 2, 3)}
+        await self.cache.get_many_or_load(namespaces, "all", "card", load)
+        await self.cache.invalidate("profile:2")
+        cards = await self.cache.get_many_or_load(namespaces, "all", "card", load)
+        self.assertEqual(calls, [[1, 2, 3], [2]])
+        self.assertEqual(cards, {user_id: {"user_id": user_id} for user_id in (1, 2, 3)})
+
+
+class BackendErrorTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = ReadThroughCache(DownBackend())
+
+    async def test_get_loads(self):
+        load = Loader("p1")
+        with self.assertLogs("src.cache", "ERROR"):
+            self.assertEqual(await self.cache.get_or_load(["project:1"], 1, "project", load), "p1")
+            self.assertEqual(await self.cache.get_or_load(["project:1"], 1, "project", load), "p1")
+        self.assertEqual(load.calls, 2)
+        self.assertEqual(self.cache.counters["errors"], 2)
+
+    async def test_get_many_loads_every_item(self):
+        with self.assertLogs("src.cache", "ERROR"):
+            cards = await self.cache.get_many_or_load({1: "profile:1", 2: "profile:2"}, "all", "card",
+                                                      lambda missing: {user_id: user_id for user_id in missing})
+        self.assertEqual(cards, {1: 1, 2: 2})
+
+    async def test_invalidate_does_not_raise(self):
+        with self.assertLogs("src.cache", "ERROR"):
+            await self.cache.invalidate("project:1", "projects:all")
+        self.assertEqual(self.cache.counters["errors"], 1)
+
+    async def test_failed_write_returns_the_value(self):
+        backend = FakeBackend()
+        cache = ReadThroughCache(backend)
+
+        async def fail(key, value, ttl):
+            raise ConnectionError("cache down")
+
+        await cache.get_or_load(["project:1"], 1, "project", Loader("old"))
+        backend.set = fail
+        with self.assertLogs("src.cache", "ERROR"):
+            self.assertEqual(await cache.get_or_load(["project:2"], 1, "project", Loader("p2")), "p2")
+        self.assertEqual(cache._flights, {})
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = FakeBackend()
+        self.cache = ReadThroughCache(self.backend)
+
+    async def wait_for_load(self, load):
+        while not load.calls:
+            await asyncio.sleep(0.01)
+
+    async def test_concurrent_misses_share_one_load(self):
+        load = Loader({"name": "p1"}, gated=True)
+        requests = [asyncio.ensure_future(self.cache.get_or_load(["project:1"], 1, "project", load))
+                    for _ in range(5)]
+        await self.wait_for_load(load)
+        load.release.set()
+        self.assertEqual(await asyncio.gather(*requests), [{"name": "p1"}] * 5)
+        self.assertEqual(load.calls, 1)
+        self.assertEqual(self.cache.counters["joined"], 4)
+        self.assertEqual(len([key for key in self.backend.writes if not key.startswith("version:")]), 1)
+
+    async def test_waiters_get_the_error(self):
+        release = threading.Event()
+
+        def fail():
+            release.wait(5)
+            raise ValueError("database down")
+
+        requests = [asyncio.ensure_future(self.cache.get_or_load(["project:1"], 1, "project", fail))
+                    for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(self.cache._flights, {})
+
+    async def test_waiter_loads_when_the_loading_request_is_cancelled(self):
+        first = Loader("first", gated=True)
+        loading = asyncio.ensure_future(self.cache.get_or_load(["project:1"], 1, "project", first))
+        await self.wait_for_load(first)
+        second = Loader("second")
+        waiting = asyncio.ensure_future(self.cache.get_or_load(["project:1"], 1, "project", second))
+        await asyncio.sleep(0.01)
+        loading.cancel()
+        self.assertEqual(await waiting, "second")
+        first.release.set()
+
+    async def test_different_keys_load_separately(self):
+        load = Loader("p")
+        await asyncio.gather(self.cache.get_or_load(["project:1"], 1, "project", load),
+                             self.cache.get_or_load(["project:1"], 2, "project", load))
+        self.assertEqual(load.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import gzip
+import unittest
+import zlib
+
+from src import compression
+from src.compression import (CompressionMiddleware, CompressionResponder, GzipEncoder, accepted_encodings,
+                             select_encoder)
+
+BODY = b"ticket " * 1000
+
+
+def respond(*bodies, headers=()):
+    """ASGI app sending the bodies as one message each, every one but the last with more_body."""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(name.encode(), value.encode()) for name, value in headers]})
+        for i, body in enumerate(bodies):
+            await send({"type": "http.response.body", "body": body, "more_body": i < len(bodies) - 1})
+    return app
+
+
+async def call(app, accept_encoding="gzip"):
+    """Response headers and the body messages sent by app."""
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    await app(scope, None, send)
+    start, *bodies = messages
+    return {name.decode().lower(): value.decode() for name, value in start["headers"]}, bodies
+
+
+def gzip_responder(app, minimum_size=100):
+    return CompressionResponder(app, GzipEncoder, minimum_size)
+
+
+class CompressionResponderTest(unittest.IsolatedAsyncioTestCase):
+    async def test_whole_body(self):
+        headers, bodies = await call(gzip_responder(respond(BODY, headers=[("content-length", str(len(BODY)))])))
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(headers["content-length"], str(len(bodies[0]["body"])))
+        self.assertEqual(gzip.decompress(bodies[0]["body"]), BODY)
+
+    async def test_vary_is_added_to(self):
+        headers, _ = await call(gzip_responder(respond(BODY, headers=[("vary", "Origin")])))
+        self.assertEqual(headers["vary"], "Origin, Accept-Encoding")
+
+    async def test_small_body_passes_through(self):
+        headers, bodies = await call(gzip_responder(respond(b"small")))
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(bodies[0]["body"], b"small")
+
+    async def test_small_content_length_passes_through(self):
+        chunks = [b"a" * 40, b"b" * 40]
+        headers, bodies = await call(gzip_responder(respond(*chunks, headers=[("content-length", "80")])))
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual([body["body"] for body in bodies], chunks)
+
+    async def test_encoded_body_passes_through(self):
+        encoded = gzip.compress(BODY)
+        headers, bodies = await call(gzip_responder(respond(encoded, headers=[("content-encoding", "gzip")])))
+        self.assertEqual(bodies[0]["body"], encoded)
+        self.assertNotIn("vary", headers)
+
+    async def test_stream_is_flushed_per_chunk(self):
+        chunks = [b"line %d\n" % i * 20 for i in range(5)]
+        headers, bodies = await call(gzip_responder(respond(*chunks, headers=[("content-length", "99999")])))
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertNotIn("content-length", headers)
+        self.assertEqual(len(bodies), len(chunks))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for chunk, body in zip(chunks, bodies):
+            # every message decodes to its chunk without waiting for the next one
+            self.assertEqual(decompressor.decompress(body["body"]), chunk)
+        self.assertTrue(decompressor.eof)
+        self.assertFalse(bodies[-1].get("more_body", False))
+
+
+class CompressionMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    async def test_without_accept_encoding(self):
+        headers, bodies = await call(CompressionMiddleware(respond(BODY), minimum_size=100), accept_encoding="")
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(bodies[0]["body"], BODY)
+
+    async def test_gzip(self):
+        headers, bodies = await call(CompressionMiddleware(respond(BODY), minimum_size=100),
+                                     accept_encoding="gzip, br;q=0")
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(bodies[0]["body"]), BODY)
+
+    @unittest.skipIf(compression.brotli is None, "brotli is not installed")
+    async def test_brotli_is_preferred(self):
+        headers, bodies = await call(CompressionMiddleware(respond(BODY), minimum_size=100),
+                                     accept_encoding="gzip, br")
+        self.assertEqual(headers["content-encoding"], "br")
+        self.assertEqual(compression.brotli.decompress(bodies[0]["body"]), BODY)
+
+
+class NegotiationTest(unittest.TestCase):
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings("GZIP, br;q=0, deflate;q=0.5, x;q=bad"), {"gzip", "deflate"})
+
+    def test_nothing_supported(self):
+        self.assertIsNone(select_encoder("deflate, identity"))
+
+    def test_gzip(self):
+        self.assertIs(select_encoder("gzip;q=0.8"), GzipEncoder)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.board import history
+from src.board.models import TicketEvent
+from src.db import Base
+
+
+class HistoryPageTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = sessionmaker(bind=self.engine)()
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    def record(self, count: int, ticket_id: int = 1):
+        for change in range(count):
+            history.record(self.session, ticket_id, 1, 1, "updated", {"change": change})
+            self.session.commit()
+
+    def walk(self, limit: int):
+        pages, cursor = [], None
+        while len(pages) < 10:
+            events, cursor = history.page(self.session.query(TicketEvent).filter_by(ticket_id=1), cursor, limit)
+            pages.append([event.changes["change"] for event in events])
+            if cursor is None:
+                break
+        return pages
+
+    def test_pages_newest_first(self):
+        self.record(5)
+        self.assertEqual(self.walk(2), [[4, 3], [2, 1], [0]])
+
+    def test_no_cursor_on_a_full_last_page(self):
+        self.record(4)
+        self.assertEqual(self.walk(2), [[3, 2], [1, 0]])
+
+    def test_events_in_the_same_instant(self):
+        self.record(3)
+        self.session.query(TicketEvent).update({TicketEvent.created: self.session.query(TicketEvent).first().created})
+        self.session.commit()
+        self.assertEqual(self.walk(1), [[2], [1], [0]])
+
+    def test_other_tickets_are_left_out(self):
+        self.record(2)
+        self.record(2, ticket_id=2)
+        self.assertEqual(self.walk(10), [[1, 0]])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(HTTPException) as raised:
+            history.page(self.session.query(TicketEvent), "not a cursor", 2)
+        self.assertEqual(raised.exception.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
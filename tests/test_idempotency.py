@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from src.board import idempotency
+from src.board.models import IdempotencyKey
+from src.db import Base
+
+
+class Ticket(BaseModel):
+    name: str
+
+
+class IdempotencyTest(unittest.TestCase):
+    def setUp(self):
+        # a file, so that concurrent sessions get connections of their own
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.directory.name, 'keys.db')}")
+        Base.metadata.create_all(self.engine)
+        self.sessions = sessionmaker(bind=self.engine)
+        self.session = self.sessions()
+        idempotency._cache.clear()
+        self.hash = idempotency.fingerprint(Ticket(name="t"))
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.directory.cleanup()
+        idempotency._cache.clear()
+
+    def stored(self, session=None, request_hash=None):
+        return idempotency.get_stored_response(session or self.session, "key-1", 1, "create_ticket",
+                                               request_hash or self.hash)
+
+    def commit(self, response, session=None, request_hash=None):
+        return idempotency.commit(session or self.session, "key-1", 1, "create_ticket", request_hash or self.hash,
+                                  response)
+
+    def test_fingerprint_ignores_key_order(self):
+        class Pair(BaseModel):
+            a: int
+            b: int
+
+        self.assertEqual(idempotency.fingerprint(Pair(a=1, b=2)), idempotency.fingerprint(Pair(b=2, a=1)))
+        self.assertNotEqual(self.hash, idempotency.fingerprint(Ticket(name="other")))
+
+    def test_without_key(self):
+        self.assertIsNone(idempotency.get_stored_response(self.session, None, 1, "create_ticket", self.hash))
+        self.assertEqual(idempotency.commit(self.session, None, 1, "create_ticket", self.hash, {"id": 1}), {"id": 1})
+        self.assertEqual(self.session.query(IdempotencyKey).count(), 0)
+
+    def test_replay(self):
+        self.assertIsNone(self.stored())
+        self.assertEqual(self.commit({"id": 1}), {"id": 1})
+        self.assertEqual(self.stored(), {"id": 1})
+
+    def test_replay_from_the_database(self):
+        self.commit({"id": 1})
+        # another worker, without the key in its process cache
+        idempotency._cache.clear()
+        self.assertEqual(self.stored(self.sessions()), {"id": 1})
+
+    def test_different_request(self):
+        self.commit({"id": 1})
+        other = idempotency.fingerprint(Ticket(name="other"))
+        for clear in (False, True):
+            if clear:
+                idempotency._cache.clear()
+            with self.assertRaises(HTTPException) as raised:
+                self.stored(request_hash=other)
+            self.assertEqual(raised.exception.status_code, 422)
+
+    def test_expired_key_is_reused(self):
+        self.commit({"id": 1})
+        idempotency._cache.clear()
+        self.session.query(IdempotencyKey).update({IdempotencyKey.expires: datetime.now(timezone.utc)
+                                                   - timedelta(seconds=1)})
+        self.session.commit()
+        self.assertIsNone(self.stored())
+        self.assertEqual(self.commit({"id": 2}), {"id": 2})
+        self.assertEqual([key.response for key in self.session.query(IdempotencyKey)], [{"id": 2}])
+
+    def test_concurrent_retry_replays_the_first_response(self):
+        other = self.sessions()
+        self.assertIsNone(self.stored())
+        self.assertIsNone(self.stored(other))
+        self.commit({"id": 1}, session=other)
+        idempotency._cache.clear()
+        self.assertEqual(self.commit({"id": 2}), {"id": 1})
+        self.assertEqual(self.session.query(IdempotencyKey).count(), 1)
+        other.close()
+
+    def test_concurrent_different_request(self):
+        other = self.sessions()
+        self.commit({"id": 1}, session=other)
+        idempotency._cache.clear()
+        with self.assertRaises(HTTPException) as raised:
+            self.commit({"id": 2}, request_hash=idempotency.fingerprint(Ticket(name="other")))
+        self.assertEqual(raised.exception.status_code, 422)
+        other.close()
+
+    def test_other_integrity_errors_are_raised(self):
+        # a second key row in the same transaction, nothing was committed to replay
+        self.session.add(IdempotencyKey(key="key-1", user_id=1, endpoint="create_ticket", request_hash=self.hash,
+                                        response={}, expires=datetime.now(timezone.utc)))
+        with self.assertRaises(IntegrityError):
+            self.commit({"id": 1})
+
+    def test_purge_expired(self):
+        now = datetime.now(timezone.utc)
+        self.session.add_all([IdempotencyKey(key=f"key-{i}", user_id=1, endpoint="create_ticket",
+                                             request_hash=self.hash, response={},
+                                             expires=now + timedelta(hours=-1 if i < 5 else 1))
+                              for i in range(7)])
+        self.session.commit()
+        self.assertEqual(idempotency.purge_expired(self.session, chunk_size=2), 5)
+        self.assertEqual(self.session.query(IdempotencyKey).count(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
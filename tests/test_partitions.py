@@ -0,0 +1,93 @@
+import os
+import unittest
+import uuid
+from datetime import date, datetime, timezone
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from src.board import history
+
+# a postgres database to create a scratch schema in, e.g. postgresql://postgres@localhost/board
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL', '')
+
+
+@unittest.skipUnless(TEST_DATABASE_URL.startswith("postgresql"), "partitions need TEST_DATABASE_URL of postgres")
+class EnsurePartitionsTest(unittest.TestCase):
+    def setUp(self):
+        self.schema = f"test_partitions_{uuid.uuid4().hex[:8]}"
+        self.admin = create_engine(TEST_DATABASE_URL)
+        with self.admin.begin() as connection:
+            connection.execute(text(f"CREATE SCHEMA {self.schema}"))
+        self.addCleanup(self.drop_schema)
+        self.engine = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-csearch_path={self.schema}"})
+        with self.engine.begin() as connection:
+            # the table of the migration, before any monthly partition exists
+            connection.execute(text("""
+                CREATE TABLE ticket_events (
+                    id BIGSERIAL NOT NULL,
+                    created TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+                    ticket_id INTEGER NOT NULL,
+                    project_id INTEGER,
+                    user_id INTEGER,
+                    action VARCHAR NOT NULL,
+                    changes JSON NOT NULL,
+                    PRIMARY KEY (id, created)
+                ) PARTITION BY RANGE (created)
+            """))
+            connection.execute(text("CREATE INDEX ix_ticket_events_ticket_id_created_id "
+                                    "ON ticket_events (ticket_id, created, id)"))
+            connection.execute(text("CREATE TABLE ticket_events_default PARTITION OF ticket_events DEFAULT"))
+        self.session = sessionmaker(bind=self.engine)()
+        self.this_month = date.today().replace(day=1)
+
+    def drop_schema(self):
+        self.session.close()
+        self.engine.dispose()
+        with self.admin.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {self.schema} CASCADE"))
+        self.admin.dispose()
+
+    def add_event(self, month: int) -> int:
+        day = history.add_months(self.this_month, month)
+        return self.session.execute(text(
+            "INSERT INTO ticket_events (created, ticket_id, action, changes) VALUES (:created, 1, 'updated', '{}') "
+            "RETURNING id"), {"created": datetime(day.year, day.month, 15, tzinfo=timezone.utc)}).scalar()
+
+    def partition_of(self, event_id: int) -> str:
+        return self.session.execute(text("SELECT tableoid::regclass::text FROM ticket_events WHERE id = :id"),
+                                    {"id": event_id}).scalar()
+
+    def month_name(self, month: int) -> str:
+        return f"ticket_events_{history.add_months(self.this_month, month):%Y_%m}"
+
+    def test_creates_the_missing_months(self):
+        self.session.execute(text(f"CREATE TABLE {self.month_name(1)} PARTITION OF ticket_events "
+                                  f"FOR VALUES FROM ('{history.add_months(self.this_month, 1)}') "
+                                  f"TO ('{history.add_months(self.this_month, 2)}')"))
+        self.session.commit()
+        self.assertEqual(history.ensure_partitions(self.session, months=3), [self.month_name(0), self.month_name(2)])
+        self.assertEqual(history.ensure_partitions(self.session, months=3), [])
+
+    def test_moves_rows_out_of_the_default_partition(self):
+        this_month, later = self.add_event(0), self.add_event(36)
+        self.session.commit()
+        history.ensure_partitions(self.session, months=2)
+        self.assertEqual(self.partition_of(this_month), self.month_name(0))
+        self.assertEqual(self.partition_of(later), "ticket_events_default")
+
+    def test_partitions_get_the_parent_indexes(self):
+        history.ensure_partitions(self.session, months=1)
+        indexes = self.session.execute(text("SELECT indexdef FROM pg_indexes WHERE schemaname = :schema "
+                                            "AND tablename = :name"),
+                                       {"schema": self.schema, "name": self.month_name(0)}).scalars().all()
+        self.assertEqual(len(indexes), 2)
+        self.assertTrue(any("(ticket_id, created, id)" in index for index in indexes))
+
+    def test_inserts_after_attaching(self):
+        history.ensure_partitions(self.session, months=1)
+        self.assertEqual(self.partition_of(self.add_event(0)), self.month_name(0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from src.ratelimit import Budget, ConcurrencyLimitMiddleware, MemoryBackend, RateLimitMiddleware
+from src.utils import create_access_token
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def http_scope(path="/board/tickets", method="GET", token=None, client=("10.0.0.1", 5000)):
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return {"type": "http", "method": method, "path": path, "headers": headers, "client": client}
+
+
+async def call(middleware, scope):
+    """Status and headers of the response the middleware sends."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope, receive, send)
+    start = messages[0]
+    return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}
+
+
+async def ok(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+class MemoryBackendTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("src.ratelimit.time", mock.Mock(monotonic=self.clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.backend = MemoryBackend()
+        self.budget = Budget(rate=2, burst=3)
+
+    async def test_burst_then_wait(self):
+        waits = [await self.backend.take("user:1", self.budget) for _ in range(4)]
+        self.assertEqual(waits, [0, 0, 0, 0.5])
+
+    async def test_refill(self):
+        for _ in range(3):
+            await self.backend.take("user:1", self.budget)
+        self.clock.now += 0.5
+        self.assertEqual(await self.backend.take("user:1", self.budget), 0)
+        self.assertEqual(await self.backend.take("user:1", self.budget), 0.5)
+
+    async def test_refill_stops_at_burst(self):
+        await self.backend.take("user:1", self.budget)
+        self.clock.now += 3600
+        waits = [await self.backend.take("user:1", self.budget) for _ in range(4)]
+        self.assertEqual(waits, [0, 0, 0, 0.5])
+
+    async def test_keys_are_separate(self):
+        for _ in range(3):
+            await self.backend.take("user:1", self.budget)
+        self.assertEqual(await self.backend.take("user:2", self.budget), 0)
+
+    async def test_least_recently_used_keys_are_evicted(self):
+        backend = MemoryBackend(max_keys=2)
+        for key in ("user:1", "user:2", "user:3"):
+            await backend.take(key, self.budget)
+        self.assertEqual(list(backend._buckets), ["user:2", "user:3"])
+
+
+class RateLimitMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.middleware = RateLimitMiddleware(ok, MemoryBackend(), {
+            ("GET", "/board/tickets"): Budget(rate=0.1, burst=1, role="admin"),
+            ("POST", "/auth/login"): Budget(rate=0.25, burst=1),
+        }, default_budget=Budget(rate=1, burst=2))
+
+    async def test_retry_after(self):
+        self.assertEqual((await call(self.middleware, http_scope("/auth/login", "POST")))[0], 200)
+        status, headers = await call(self.middleware, http_scope("/auth/login", "POST"))
+        self.assertEqual(status, 429)
+        self.assertEqual(headers["retry-after"], "4")
+
+    async def test_anonymous_requests_are_keyed_on_the_client(self):
+        await call(self.middleware, http_scope("/auth/login", "POST"))
+        other = http_scope("/auth/login", "POST", client=("10.0.0.2", 5000))
+        self.assertEqual((await call(self.middleware, other))[0], 200)
+
+    async def test_role_budget(self):
+        admin = create_access_token("a@x", role="admin")
+        statuses = [(await call(self.middleware, http_scope(token=admin)))[0] for _ in range(2)]
+        self.assertEqual(statuses, [200, 429])
+
+    async def test_other_roles_use_the_default_budget(self):
+        manager = create_access_token("m@x", role="manager")
+        statuses = [(await call(self.middleware, http_scope(token=manager)))[0] for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    async def test_invalid_token_is_anonymous(self):
+        for _ in range(2):
+            await call(self.middleware, http_scope("/board/projects", token="not a token"))
+        self.assertEqual((await call(self.middleware, http_scope("/board/projects")))[0], 429)
+
+
+class ConcurrencyLimitMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    async def test_sheds_past_max_in_flight(self):
+        release = asyncio.Event()
+
+        async def slow(scope, receive, send):
+            await release.wait()
+            await ok(scope, receive, send)
+
+        middleware = ConcurrencyLimitMiddleware(slow, max_in_flight=2, retry_after=3)
+        serving = [asyncio.ensure_future(call(middleware, http_scope())) for _ in range(2)]
+        await asyncio.sleep(0)
+        status, headers = await call(middleware, http_scope())
+        self.assertEqual((status, headers["retry-after"]), (503, "3"))
+        release.set()
+        self.assertEqual([status for status, _ in await asyncio.gather(*serving)], [200, 200])
+        self.assertEqual(middleware.in_flight, 0)
+        self.assertEqual((await call(middleware, http_scope()))[0], 200)
+
+    async def test_in_flight_is_released_on_errors(self):
+        async def fail(scope, receive, send):
+            raise ValueError("handler failed")
+
+        middleware = ConcurrencyLimitMiddleware(fail, max_in_flight=1)
+        with self.assertRaises(ValueError):
+            await call(middleware, http_scope())
+        self.assertEqual(middleware.in_flight, 0)
+
+    async def test_other_scopes_pass(self):
+        scopes = []
+
+        async def app(scope, receive, send):
+            scopes.append(scope["type"])
+
+        middleware = ConcurrencyLimitMiddleware(app, max_in_flight=0)
+        await middleware({"type": "lifespan"}, None, None)
+        self.assertEqual(scopes, ["lifespan"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from operator import attrgetter
+
+from fastapi import HTTPException
+
+from src.board.models import Project, Ticket
+from src.sharding import ShardRouter, ShardSessions, init_shards, merge_pages
+
+
+class RoutingTest(unittest.TestCase):
+    def setUp(self):
+        self.router = ShardRouter(["sqlite://", "sqlite://", "sqlite://"], {12: 0}, 1000)
+
+    def test_owner_by_id(self):
+        self.assertEqual([self.router.shard_for_owner(owner) for owner in (1, 2, 3, 4)], [1, 2, 0, 1])
+
+    def test_pinned_owner(self):
+        self.assertEqual(self.router.shard_for_owner(12), 0)
+
+    def test_no_owner(self):
+        self.assertEqual(self.router.shard_for_owner(None), 0)
+
+    def test_id_ranges(self):
+        self.assertEqual([self.router.shard_for_id(object_id) for object_id in (1, 1000, 1001, 2000, 2001)],
+                         [0, 0, 1, 1, 2])
+
+    def test_ids_past_the_last_range(self):
+        self.assertEqual(self.router.shard_for_id(10 ** 6), 2)
+
+
+class ShardDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        urls = [f"sqlite:///{os.path.join(self.directory.name, f'shard{shard}.db')}" for shard in range(2)]
+        self.router = ShardRouter(urls, {}, 1000)
+        with redirect_stdout(StringIO()):
+            init_shards(self.router)
+        self.shards = ShardSessions(self.router)
+
+    def tearDown(self):
+        self.shards.close()
+        for engine in self.router._engines:
+            engine.dispose()
+        self.directory.cleanup()
+
+    def add_project(self, owner_id: int, name: str) -> Project:
+        session = self.shards.for_owner(owner_id)
+        project = Project(name=name, description="", user_id=owner_id)
+        session.add(project)
+        session.commit()
+        return project
+
+    def test_ids_come_from_the_shard_range(self):
+        project = self.add_project(1, "p1")
+        self.assertEqual(project.id, 1001)
+        self.assertIs(self.shards.for_id(project.id), self.shards.for_owner(1))
+        self.assertEqual(self.add_project(2, "p2").id, 1)
+
+    def test_check_same_shard(self):
+        self.shards.check_same_shard(self.shards.for_owner(1), self.shards.for_owner(3))
+        with self.assertRaises(HTTPException) as raised:
+            self.shards.check_same_shard(self.shards.for_owner(1), self.shards.for_owner(2))
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_merge_pages(self):
+        for owner_id, name in [(1, "b"), (2, "a"), (1, "d"), (2, "c"), (2, "e")]:
+            self.add_project(owner_id, name)
+        queries = [session.query(Project).order_by(Project.name) for session in self.shards.all()]
+        key = attrgetter("name")
+        self.assertEqual([project.name for project in merge_pages(queries, key)], ["a", "b", "c", "d", "e"])
+        self.assertEqual([project.name for project in merge_pages(queries, key, 1, 2)], ["b", "c"])
+        self.assertEqual([project.name for project in merge_pages(queries, key, 4, 10)], ["e"])
+        self.assertEqual(merge_pages(queries, key, 5, 10), [])
+
+    def test_merge_pages_of_one_shard(self):
+        self.add_project(1, "a")
+        self.add_project(1, "b")
+        queries = [self.shards.for_owner(1).query(Project).order_by(Project.name)]
+        self.assertEqual([project.name for project in merge_pages(queries, attrgetter("name"), 1)], ["b"])
+
+    def test_project_delete_cascades_to_tickets(self):
+        project = self.add_project(1, "p1")
+        session = self.shards.for_id(project.id)
+        session.add_all([Ticket(name="t", description="", project_id=project.id) for _ in range(3)])
+        session.commit()
+        session.query(Project).filter_by(id=project.id).delete(synchronize_session=False)
+        session.commit()
+        self.assertEqual(session.query(Ticket).count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()